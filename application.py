@@ -1,174 +1,2029 @@
-import pywebio
-from pywebio import start_server
-from pywebio.input import *
-from pywebio.output import *
+import argparse
+import contextlib
+import gc
+import hashlib
+import importlib
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
 import numpy as np
 import pandas as pd
-from plotly import express as px
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.process
+import tornado.web
+# pywebio and plotly are slow to import, so they are imported by the functions using them; the 
+# build and match commands, the api, and the benchmarks start without them, see warm_up
+
+logger = logging.getLogger(__name__)
+
+
+def Website():
+    '''
+    Uses pywebio built-in functions to create a functional website where users can input GPA, preferred 
+    school type, preferred number of undergraduates in each grade level, and preferred region of study. 
+    Website outputs suggestions for schools to apply to in the form of an interactive plotly map and table.
+    '''
+    from pywebio.input import checkbox, input, select
+    from pywebio.output import put_buttons, put_html, put_image, put_markdown, put_scope, put_text, use_scope
+    from pywebio.session import hold, run_js
+
+    put_markdown('### Answer a couple questions and we will tell you where to apply!'), put_markdown('# **Welcome to Your College Application Guide**') # sets website heading and subheading
+    if MAP_MODE != "full":
+        # loads plotly.js from this server instead of the CDN, the browser then caches it across sessions
+        run_js('require.config({paths: {plotly: "static/plotly.min"}})')
+    with use_scope('scope1'):
+        # lets users select their gpa from drop-down menu
+        gpa = select("Select your GPA (Round for best approximation)：", ['4.0','3.9','3.8','3.7','3.6','3.5','3.4','3.3','3.2','3.1','3.0','2.9','2.8','2.7','2.6','2.5','2.4','2.3','2.2','2.1','2.0']) 
+        gpa = float(gpa)
+        # lets users choose preferred type of school via checkbox
+        school_type = checkbox("Private vs. Public：", options=['Private', 'Public'])
+        # lets users choose preferred number of undergraduates in each grade level via checkbox
+        num_undergrads = select("Number of undergraduates per grade：", ['0 to 500 (Very Small)', '500 to 1,000 (Small)', '1,000 to 5,000 (Medium)', '5,000 to 10,000 (Large)', '10,000+ (Very Large)'])
+        # shows map of different US regions
+        put_image('https://www.mappr.co/wp-content/uploads/2021/12/us-regions-map-census.jpg')
+        # lets users choose preferred region of study via checkbox
+        location = checkbox("Preferred region of study：", options=['West', 'Midwest', 'Northeast', 'South'])
+        # lets users optionally keep only colleges near a place
+        coordinates = input("Near (latitude, longitude), optional：", placeholder="34.07, -118.44", 
+                            required=False, validate=check_coordinates)
+        miles = select("Within (miles)：", ["Any distance"] + NEAR_MILES)
+        near = None
+        if coordinates.strip() != "" and miles != "Any distance":
+            near = parse_coordinates(coordinates) + (float(miles), None)
+    
+    # times the stages of answering the form when the server runs with --metrics
+    with request_trace("website"), use_scope('scope1', clear=True):
+        # calls function for creating the map html of suggested colleges per user inputs
+        college_map_html = render_map(gpa, school_type, num_undergrads, location, near)
+        with span("send"):
+            put_html(college_map_html)
+        # ranked colleges that fit the user best, including reaches above their GPA
+        put_markdown('### Top %d matches' % TOP_MATCHES)
+        top_matches_html = render_top_matches(gpa, school_type, num_undergrads, location)
+        with span("send"):
+            put_html(top_matches_html)
+        put_markdown('### All colleges you qualify for')
+        put_scope('college_table')
+
+    # table shows one page of suggested colleges at a time, sorted on the server
+    table_state = {"sort_by": None, "descending": False, "page": 0}
+
+    def show_table():
+        with request_trace("table"):
+            college_table_html, page_count = render_table(gpa, school_type, num_undergrads, location, 
+                                                          table_state["sort_by"], table_state["descending"], 
+                                                          table_state["page"], near)
+            with use_scope('college_table', clear=True):
+                put_buttons([{"label": "Sort by " + label, "value": label} for label in SORT_COLUMNS], onclick=sort_table)
+                with span("send"):
+                    put_html(college_table_html)
+                put_text("Page %d of %d" % (table_state["page"] + 1, page_count))
+                put_buttons(["Previous", "Next"], onclick=lambda button: turn_page(button, page_count))
+
+    def sort_table(label):
+        # clicking the same column again flips the order
+        if table_state["sort_by"] == label:
+            table_state["descending"] = not table_state["descending"]
+        else:
+            table_state["sort_by"] = label
+            table_state["descending"] = False
+        table_state["page"] = 0
+        show_table()
+
+    def turn_page(button, page_count):
+        step = 1 if button == "Next" else -1
+        table_state["page"] = min(max(table_state["page"] + step, 0), page_count - 1)
+        show_table()
+
+    show_table()
+    # keeps the session open so the sort and page buttons keep working
+    hold()
+        
+
+def parse_coordinates(text):
+    '''
+    Input: 
+    - text such as "34.07, -118.44"
+    
+    Output: 
+    - tuple of the latitude and longitude in degrees, raising ValueError when they are not valid
+    '''
+    parts = text.replace(",", " ").split()
+    if len(parts) != 2:
+        raise ValueError("enter a latitude and a longitude")
+    try:
+        latitude, longitude = float(parts[0]), float(parts[1])
+    except ValueError:
+        raise ValueError("latitude and longitude must be numbers")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("latitude must be -90 to 90 and longitude -180 to 180")
+    return latitude, longitude
+
+
+def check_coordinates(text):
+    '''Returns an error message for the website's coordinates input, or None when it is empty or valid'''
+    if text.strip() == "":
+        return None
+    try:
+        parse_coordinates(text)
+    except ValueError as error:
+        return str(error)
+    return None
+
+
+class RenderCache:
+    '''
+    Least recently used cache of rendered html, bounded by a number of entries and a total size in 
+    characters. Entries belong to one dataset version and are all dropped when the version changes. 
+    It also keeps the positions matching each query, sized by their number of positions.
+    '''
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, version, key):
+        '''Returns the cached value for key, or None when it is missing or from an older dataset version'''
+        with self.lock:
+            if version != self.version:
+                self._clear(version)
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, version, key, value):
+        '''Stores value, a tuple of html strings or arrays, evicting the least recently used entries to stay in bounds'''
+        value_size = sum(len(part) for part in value)
+        with self.lock:
+            if version != self.version:
+                self._clear(version)
+            if key in self.entries or value_size > self.max_bytes:
+                return
+            self.entries[key] = value
+            self.size += value_size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= sum(len(part) for part in evicted)
+
+    def stats(self):
+        '''Returns a dictionary of the hit and miss counters and the current size of the cache'''
+        with self.lock:
+            return {"hits": self.hits, 
+                    "misses": self.misses, 
+                    "entries": len(self.entries), 
+                    "bytes": self.size}
+
+    def _clear(self, version):
+        self.version = version
+        self.entries.clear()
+        self.size = 0
+
+
+class Metrics:
+    '''
+    Counters and histograms of the website's requests, keyed by metric name and label values, 
+    written out in the Prometheus text format. The names, types, help texts and histogram buckets 
+    of the metrics are listed in METRICS.
+    '''
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.values = {name: {} for name in metrics}
+        self.lock = threading.Lock()
+
+    def add(self, name, labels, amount=1):
+        '''Adds amount to the counter name with the labels, a tuple of (label, value) pairs'''
+        with self.lock:
+            values = self.values[name]
+            values[labels] = values.get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        '''Counts value in the histogram name with the labels, a tuple of (label, value) pairs'''
+        buckets = self.metrics[name][2]
+        with self.lock:
+            values = self.values[name]
+            if labels not in values:
+                # counts per bucket, then the sum and count of every value
+                values[labels] = [[0] * len(buckets), 0.0, 0]
+            counts = values[labels]
+            for position, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[0][position] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    def text(self, gauges=()):
+        '''
+        Returns the metrics in the Prometheus text format, followed by gauges, a list of 
+        (name, help, value) tuples of values read when the metrics are scraped
+        '''
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in self.metrics.items():
+                lines += ["# HELP %s %s" % (name, help_text), "# TYPE %s %s" % (name, kind)]
+                for labels, value in sorted(self.values[name].items()):
+                    if kind == "counter":
+                        lines.append("%s%s %s" % (name, metric_labels(labels), value))
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(buckets, counts):
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append("%s_bucket%s %d" % (name, metric_labels(labels + (("le", le),)), bucket_count))
+                    lines.append("%s_sum%s %r" % (name, metric_labels(labels), total))
+                    lines.append("%s_count%s %d" % (name, metric_labels(labels), count))
+        for name, help_text, value in gauges:
+            lines += ["# HELP %s %s" % (name, help_text), "# TYPE %s gauge" % name, "%s %s" % (name, value)]
+        return "\n".join(lines) + "\n"
+
+
+def metric_labels(labels):
+    '''Returns the labels, a tuple of (label, value) pairs, written like {stage="filter"}'''
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (label, str(value).replace("\\", "\\\\").replace('"', '\\"')) 
+                             for label, value in labels)
+
+
+# "clustered" draws maps of many colleges with college_recs_map_clustered and the others like "compact", 
+# "compact" draws maps with college_recs_map_compact and loads plotly.js from this server, 
+# "full" draws them with college_recs_map and loads plotly.js from the pywebio CDN
+MAP_MODE = "clustered"
+
+# maps of more colleges than this are drawn as clusters in "clustered" mode
+CLUSTER_MIN_COLLEGES = 300
+# zoom levels the clusters are computed for, each level is shown from its zoom up to the next one
+CLUSTER_ZOOMS = [2, 4, 6]
+# width in pixels of the grid cells colleges are clustered by, at every zoom level
+CLUSTER_CELL_PIXELS = 48
+
+# folder served at /static/ that holds the plotly.js bundled with the plotly package
+STATIC_DIR = os.path.join(importlib.util.find_spec("plotly").submodule_search_locations[0], "package_data")
+
+
+# number of colleges shown on each page of the table
+PAGE_SIZE = 25
+
+# columns the table can be sorted by, keyed by the label of their sort button
+SORT_COLUMNS = {
+    "GPA": "GPA",
+    "Acceptance Rate": "Acceptance Rate",
+    "Size": "Number of Students"
+}
+
+# maximum number of queries and total characters of html kept by the render cache
+RENDER_CACHE_ENTRIES = 512
+RENDER_CACHE_BYTES = 256 * 1024 * 1024
+
+# rendered map and table html shared by every website session
+render_cache = RenderCache(RENDER_CACHE_ENTRIES, RENDER_CACHE_BYTES)
+
+# maximum number of queries and total number of positions kept by the positions cache of each 
+# dataset version, which api requests with any GPA or coordinates would otherwise grow without end
+POSITIONS_CACHE_ENTRIES = 8192
+POSITIONS_CACHE_ROWS = 4 * 1024 * 1024
+
+# process pool rendering maps and tables, None renders them in the session's own thread
+render_pool = None
+# number of worker processes of render_pool, used to start it again when a worker dies
+render_workers = 0
+# held while a broken render_pool is replaced
+_render_pool_lock = threading.Lock()
+# seconds a session waits for a worker to render before rendering in its own thread instead
+RENDER_TIMEOUT_SECONDS = 60
+
+# whether requests are timed and counted, turned on by the --metrics option of the server
+INSTRUMENT = False
+
+# seconds a request may take before its sampled stacks are written to PROFILE_DIR, None never profiles
+SLOW_REQUEST_SECONDS = None
+# folder the folded stacks of slow requests are written to, one file per request
+PROFILE_DIR = "profiles"
+# seconds between two stack samples of a profiled request
+PROFILE_INTERVAL = 0.005
+
+# upper bounds of the histogram buckets of durations in seconds and of numbers of colleges
+SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")]
+ROWS_BUCKETS = [0, 10, 100, 1000, 10000, 100000, float("inf")]
+
+# type, help text, and histogram buckets of every metric served at /metrics
+METRICS = {
+    "college_request_seconds": ("histogram", "Time to answer a request, by kind of request", SECONDS_BUCKETS), 
+    "college_stage_seconds": ("histogram", "Time spent in each stage of answering requests", SECONDS_BUCKETS), 
+    "college_result_rows": ("histogram", "Number of colleges matching a query, by kind of result", ROWS_BUCKETS), 
+    "college_response_characters_total": ("counter", "Characters of html or json sent, before encoding and compression, by kind of response", None), 
+    "college_render_cache_total": ("counter", "Render cache lookups, by kind of html and whether it was cached", None), 
+}
+
+# metrics of the requests answered by this process
+metrics = Metrics(METRICS)
+
+# spans of the request being answered by each thread, see request_trace
+_traces = threading.local()
+
+# folded stacks sampled from each thread answering a profiled request, keyed by thread id
+_profiled = {}
+_profiled_lock = threading.Lock()
+
+
+def map_html(query):
+    '''
+    Input: 
+    - query tuple returned by normalize_query
+    
+    Output: 
+    - map html of the colleges matching the query
+    '''
+    if MAP_MODE == "clustered":
+        with span("load"):
+            prepared = load_prepared()
+        with span("filter"):
+            positions = query_positions(prepared, query)
+        if len(positions) > CLUSTER_MIN_COLLEGES:
+            record_rows("map", len(positions))
+            with span("figure"):
+                college_map = college_recs_map_clustered(prepared, positions)
+            with span("serialize"):
+                return college_map.to_html(include_plotlyjs="require", full_html=False, 
+                                           post_script=cluster_zoom_script())
+
+    # calls function for creating dataframe of suggested colleges per user inputs
+    college_table = college_recs(*query)
+    record_rows("map", len(college_table))
+    # calls function for creating map of suggested colleges per user inputs
+    with span("figure"):
+        if MAP_MODE != "full":
+            college_map = college_recs_map_compact(college_table)
+        else:
+            college_map = college_recs_map(college_table)
+    
+    # converts 'college_map' plotly map to html for website
+    with span("serialize"):
+        return college_map.to_html(include_plotlyjs="require", full_html=False)
+
+
+def table_html(query, sort_by, descending, page):
+    '''
+    Input: 
+    - query tuple returned by normalize_query
+    - sort_by, descending, and page as passed to render_table
+    
+    Output: 
+    - table html of one page of the colleges matching the query
+    '''
+    with span("load"):
+        prepared = load_prepared()
+    with span("filter"):
+        positions = sorted_positions(prepared, query, sort_by, descending)
+    record_rows("table", len(positions))
+    start = page * PAGE_SIZE
+    college_table = prepared["data"].iloc[positions[start:start + PAGE_SIZE]]
+    # drops Latitude, Longitude, and unwanted index columns so they won't be displayed on website
+    college_table = college_table.drop(["Latitude", "Longitude", "index"], axis=1)
+    # numbers the rows by their place in the whole result
+    college_table.index = range(start, start + len(college_table))
+
+    # converts 'college_table' dataframe to html for website
+    with span("serialize"):
+        return college_table.to_html(border=0, render_links=True)
+
+
+def render_map(gpa_input, type_inst_input, size_input, location_input, near_input=None):
+    '''
+    Input: 
+    - the same inputs as college_recs
+    
+    Output: 
+    - map html of the recommended colleges, taken from render_cache when the same query was already 
+    rendered for the current dataset version
+    '''
+    with span("load"):
+        version = load_prepared()["version"]
+    query = normalize_query(gpa_input, type_inst_input, size_input, location_input, near_input)
+    key = ("map", query)
+    rendered = render_cache.get(version, key)
+    record_cache("map", rendered is not None)
+    if rendered is not None:
+        record_characters("map", len(rendered[0]))
+        return rendered[0]
+
+    college_map_html = run_render(map_html, query)
+    render_cache.put(version, key, (college_map_html,))
+    record_characters("map", len(college_map_html))
+    return college_map_html
+
+
+def render_table(gpa_input, type_inst_input, size_input, location_input, sort_by=None, descending=False, page=0, 
+                 near_input=None):
+    '''
+    Input: 
+    - the same inputs as college_recs
+    - sort_by: None to keep the colleges in dataset order, or a key of SORT_COLUMNS
+    - descending: whether to sort from the largest to the smallest value
+    - page: page number, starting from 0, of PAGE_SIZE colleges each
+    
+    Output: 
+    - tuple of the table html of one page of recommended colleges and the number of pages; only 
+    the rows on that page are converted to html, however many colleges match
+    '''
+    with span("load"):
+        prepared = load_prepared()
+    query = normalize_query(gpa_input, type_inst_input, size_input, location_input, near_input)
+    with span("filter"):
+        page_count = max(1, -(-len(query_positions(prepared, query)) // PAGE_SIZE))
+
+    key = ("table", query, sort_by, descending, page)
+    rendered = render_cache.get(prepared["version"], key)
+    record_cache("table", rendered is not None)
+    if rendered is not None:
+        record_characters("table", len(rendered[0]))
+        return rendered[0], page_count
+
+    college_table_html = run_render(table_html, query, sort_by, descending, page)
+    render_cache.put(prepared["version"], key, (college_table_html,))
+    record_characters("table", len(college_table_html))
+    return college_table_html, page_count
+
+
+def render_top_matches(gpa_input, type_inst_input, size_input, location_input):
+    '''
+    Input: 
+    - the GPA, type of institution, size, and location inputs of college_recs
+    
+    Output: 
+    - table html of the TOP_MATCHES colleges returned by college_rankings, taken from render_cache 
+    when the same inputs were already ranked for the current dataset version
+    '''
+    with span("load"):
+        version = load_prepared()["version"]
+    key = ("top", normalize_query(gpa_input, type_inst_input, size_input, location_input))
+    rendered = render_cache.get(version, key)
+    record_cache("top", rendered is not None)
+    if rendered is not None:
+        record_characters("top", len(rendered[0]))
+        return rendered[0]
+
+    with span("rank"):
+        rankings = college_rankings(gpa_input, type_inst_input, size_input, location_input)
+    rankings = rankings[["College", "Fit", "Score", "GPA", "Acceptance Rate", "Type of Institution", 
+                         "Number of Students", "City", "State", "Website"]]
+    rankings.index = range(1, len(rankings) + 1)
+    with span("serialize"):
+        top_matches_html = rankings.to_html(border=0, render_links=True)
+    render_cache.put(version, key, (top_matches_html,))
+    record_characters("top", len(top_matches_html))
+    return top_matches_html
+
+
+def start_render_pool(workers, restart=False):
+    '''
+    Input: 
+    - number of worker processes, 0 renders in the session's own thread
+    - restart: True when the server is already running, see restart_render_pool
+    
+    Output: 
+    - starts the process pool used by run_render; on platforms that fork, the workers share the 
+    dataset already loaded by this process instead of loading their own copy
+    '''
+    global render_pool, render_workers
+    render_workers = workers
+    if workers <= 0:
+        render_pool = None
+        return
+    if restart:
+        # forking now would copy locks held by the server's other threads into the workers, so 
+        # they start a new python process instead and load the dataset on their first render
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return
+    # loads the dataset and plotly first so forked workers inherit them
+    warm_up()
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        gc.freeze()
+    else:
+        context = None
+    render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    # starts the workers now, before the web server starts its threads
+    render_pool.submit(os.getpid).result()
+
+
+def warm_up():
+    '''
+    Output: 
+    - loads the dataset, pywebio, and plotly, and draws a map of two colleges of each kind the 
+    website draws, so plotly loads its templates and property validators before the first user 
+    waits for them. Called in the background once the server listens, or before forking worker 
+    processes so they all share what it loaded instead of each loading its own copy.
+    '''
+    prepared = load_prepared()
+    importlib.import_module("pywebio.platform.tornado")
+    positions = np.arange(min(2, len(prepared["data"])))
+    sample = prepared["data"].iloc[positions].reset_index()
+    college_maps = [college_recs_map_compact(sample), college_recs_map_clustered(prepared, positions)]
+    if MAP_MODE == "full":
+        college_maps.append(college_recs_map(sample))
+    for college_map in college_maps:
+        college_map.to_html(include_plotlyjs="require", full_html=False)
+
+
+def run_render(function, *args):
+    '''
+    Input: 
+    - map_html or table_html and its arguments
+    
+    Output: 
+    - the function's result, computed in render_pool when one was started so plotly and pandas 
+    work does not hold the GIL of the process serving the website; rendered in this thread 
+    instead when a worker died or took more than RENDER_TIMEOUT_SECONDS
+    '''
+    pool = render_pool
+    if pool is None:
+        return function(*args)
+    # the stages inside the worker process are timed there, so only the whole render is timed here
+    with span("render"):
+        try:
+            return pool.submit(function, *args).result(timeout=RENDER_TIMEOUT_SECONDS)
+        except BrokenProcessPool:
+            # a worker died, for example killed for using too much memory, and every later render 
+            # would fail with it, so the pool is started again
+            restart_render_pool(pool)
+        except FutureTimeoutError:
+            logger.error("a render worker took over %d seconds, rendering in the session's thread", 
+                         RENDER_TIMEOUT_SECONDS)
+    return function(*args)
+
+
+def restart_render_pool(broken):
+    '''
+    Input: 
+    - render_pool that raised BrokenProcessPool
+    
+    Output: 
+    - replaces it with a new pool of render_workers processes, unless another thread already did
+    '''
+    with _render_pool_lock:
+        if render_pool is broken:
+            logger.error("a render worker died, restarting %d render workers", render_workers)
+            broken.shutdown(wait=False)
+            start_render_pool(render_workers, restart=True)
+
+
+def span(stage):
+    '''
+    Input: 
+    - name of a stage of answering a request, such as "filter" or "figure"
+    
+    Output: 
+    - context manager timing the code it wraps into the college_stage_seconds metric and the 
+    trace of the current request; does nothing unless INSTRUMENT is on
+    '''
+    if not INSTRUMENT:
+        return _NO_SPAN
+    return _Span(stage)
+
+
+class _Span:
+    '''Times one stage for span'''
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        metrics.observe("college_stage_seconds", (("stage", self.stage),), seconds)
+        trace = current_trace()
+        if trace is not None:
+            trace["spans"][self.stage] = trace["spans"].get(self.stage, 0) + seconds
+        return False
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def current_trace():
+    '''Returns the trace of the request the current thread is answering, or None, see request_trace'''
+    return getattr(_traces, "trace", None)
+
+
+def record_rows(kind, rows):
+    '''Counts the number of colleges matching a query into college_result_rows, when INSTRUMENT is on'''
+    if not INSTRUMENT:
+        return
+    metrics.observe("college_result_rows", (("kind", kind),), rows)
+    trace = current_trace()
+    if trace is not None:
+        trace["rows"][kind] = rows
+
+
+def record_characters(kind, count):
+    '''Adds the characters of a response into college_response_characters_total, when INSTRUMENT is on'''
+    if not INSTRUMENT:
+        return
+    metrics.add("college_response_characters_total", (("kind", kind),), count)
+    trace = current_trace()
+    if trace is not None:
+        trace["characters"][kind] = trace["characters"].get(kind, 0) + count
+
+
+def record_cache(kind, hit):
+    '''Counts a render cache lookup into college_render_cache_total, when INSTRUMENT is on'''
+    if not INSTRUMENT:
+        return
+    result = "hit" if hit else "miss"
+    metrics.add("college_render_cache_total", (("kind", kind), ("result", result)))
+    trace = current_trace()
+    if trace is not None:
+        trace["cache"][kind] = result
+
+
+@contextlib.contextmanager
+def request_trace(kind):
+    '''
+    Input: 
+    - kind of request, such as "website" or "api"
+    
+    Output: 
+    - context manager collecting the spans, result rows, response characters, and cache lookups of the 
+    request it wraps, which must run in one thread. When it ends, the request's duration goes 
+    into the college_request_seconds metric and one json line describing it is logged. Requests 
+    slower than SLOW_REQUEST_SECONDS have their stacks sampled every PROFILE_INTERVAL seconds 
+    written to PROFILE_DIR. Does nothing unless INSTRUMENT is on.
+    '''
+    if not INSTRUMENT or current_trace() is not None:
+        # requests nested in another request are part of it
+        yield None
+        return
+
+    thread_id = threading.get_ident()
+    trace = {"spans": {}, "rows": {}, "characters": {}, "cache": {}}
+    _traces.trace = trace
+    profiling = SLOW_REQUEST_SECONDS is not None
+    if profiling:
+        with _profiled_lock:
+            _profiled[thread_id] = {}
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        seconds = time.perf_counter() - start
+        _traces.trace = None
+        stacks = None
+        if profiling:
+            with _profiled_lock:
+                stacks = _profiled.pop(thread_id)
+
+        metrics.observe("college_request_seconds", (("kind", kind),), seconds)
+        entry = {"event": "request", "kind": kind, "seconds": round(seconds, 6), 
+                 "spans": {stage: round(value, 6) for stage, value in trace["spans"].items()}, 
+                 "rows": trace["rows"], "characters": trace["characters"], "cache": trace["cache"]}
+        if profiling and seconds >= SLOW_REQUEST_SECONDS and stacks:
+            entry["profile"] = write_profile(kind, seconds, stacks)
+        logger.info(json.dumps(entry))
+
+
+def fold_stack(frame):
+    '''Returns the stack of frame from its outermost call, as the "a;b;c" line of a folded stacks file'''
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append("%s (%s)" % (code.co_name, os.path.basename(code.co_filename)))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_stacks():
+    '''Samples the stacks of the threads answering profiled requests every PROFILE_INTERVAL seconds, forever'''
+    me = threading.get_ident()
+    while True:
+        time.sleep(PROFILE_INTERVAL)
+        with _profiled_lock:
+            if not _profiled:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in _profiled.items():
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != me:
+                    stack = fold_stack(frame)
+                    stacks[stack] = stacks.get(stack, 0) + 1
+
+
+def write_profile(kind, seconds, stacks):
+    '''
+    Input: 
+    - kind of request and its duration in seconds
+    - dictionary from each folded stack sampled during the request to its number of samples
+    
+    Output: 
+    - path of the folded stacks file written to PROFILE_DIR, which flamegraph.pl or speedscope 
+    turn into a flame graph
+    '''
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, "%s-%s-%dms.folded" % (time.strftime("%Y%m%d-%H%M%S"), kind, 1000 * seconds))
+    with open(path, "w") as file:
+        for stack, count in sorted(stacks.items()):
+            file.write("%s %d\n" % (stack, count))
+    return path
+
+
+def start_instrumentation(slow_seconds=None):
+    '''
+    Input: 
+    - seconds a request may take before it is profiled, None to never profile
+    
+    Output: 
+    - turns on timing and counting of requests and, with slow_seconds, starts the thread 
+    sampling the stacks of requests being answered
+    '''
+    global INSTRUMENT, SLOW_REQUEST_SECONDS
+    INSTRUMENT = True
+    SLOW_REQUEST_SECONDS = slow_seconds
+    if slow_seconds is not None:
+        threading.Thread(target=sample_stacks, name="stack-sampler", daemon=True).start()
+
+
+def metrics_text():
+    '''
+    Output: 
+    - the metrics of this process in the Prometheus text format, with the render cache and dataset 
+    read when this is called
+    '''
+    cache = render_cache.stats()
+    prepared = _dataset_cache["prepared"]
+    gauges = [("college_render_cache_entries", "Entries in the render cache", cache["entries"]), 
+              ("college_render_cache_characters", "Characters of html in the render cache", cache["bytes"]), 
+              ("college_dataset_version", "Version of the loaded dataset", 0 if prepared is None else prepared["version"]), 
+              ("college_dataset_rows", "Colleges in the loaded dataset", 0 if prepared is None else len(prepared["data"])), 
+              ("college_dataset_refresh_failed", "1 when the last refresh of the dataset failed and an older one is served", 
+               int(_dataset_cache["failed_signature"] is not None))]
+    # the report of the last refresh, colleges and rows that are not counted in its mode are 0
+    report = {} if prepared is None else prepared["refresh"] or {}
+    for key, help_text in [("seconds", "Seconds the last refresh of the dataset took"), 
+                           ("added", "Colleges added by the last refresh of the dataset"), 
+                           ("changed", "Colleges changed by the last refresh of the dataset"), 
+                           ("removed", "Colleges removed by the last refresh of the dataset"), 
+                           ("rows_added", "Merged rows added by the last refresh of the dataset"), 
+                           ("rows_removed", "Merged rows removed by the last refresh of the dataset")]:
+        gauges.append(("college_dataset_refresh_" + key, help_text, report.get(key, 0)))
+    return metrics.text(gauges)
+
+
+def prepare_df(df):
+    '''Returns a cleaned data frame
+    Parameters: 
+        df: the data frame to be cleaned
+    Type: 
+        df: two dimensional data structure
+    Return: a cleaned data frame
+    '''
+    # selects only the columns we want to look at
+    df = df[["geo_point_2d","name", "city", "state", "country", "website"]]
+    # renames "name" column to "College" for future data merging purposes
+    df = df.rename(columns={"geo_point_2d":"Coordinates", "name": "College", "city":"City", "state":"State", "country":"Country", "website":"Website"})
+    
+    # finds index of rows in df where colleges are not in the US
+    not_USA_colleges = df[(df['Country'] != 'USA')].index 
+    
+    # delete these row indexes from dataFrame
+    df = df.drop(not_USA_colleges)
+    
+    # turns columns from all caps to having only first letter of each word capitalized
+    df["College"] = df["College"].str.title()
+    df["City"] = df["City"].str.title()
+    
+    # makes every website link https for later user functionality purposes
+    # if the website does not already start with "https://" this will be added to start of link
+    websites = df["Website"]
+    keep_website = websites.str.startswith(("https://", "NOT"))
+    # "Website" column of dataframe is updated with https websites
+    df["Website"] = websites.where(keep_website, "https://" + websites)
+    
+    return(df)
+
+# file paths of the two data sources merged by the website
+LOCATIONS_PATH = "us-colleges-and-universities.json"
+STATS_PATH = "colleges.csv"
+# typed, deduplicated colleges written by the scrapy item pipeline, used instead of colleges.csv when present
+STATS_ARROW_PATH = "colleges.arrow"
+# directory of the prebuilt dataset written by "python application.py build"
+ARTIFACT_PATH = "colleges_dataset"
+
+# dtypes of the columns stored in the prebuilt dataset, all other columns are stored as text
+ARTIFACT_DTYPES = {
+    "index": "int32",
+    "State": "category",
+    "Type of Institution": "category",
+    # float64 like the merged data, since float32 values such as 3.4 print as 3.4000000953674316
+    "GPA": "float64",
+    "Number of Students": "int32",
+    "Latitude": "float64",
+    "Longitude": "float64"
+}
+
+# Dictionary containing all the states in a given region
+REGION_DICT = {
+    "Northeast": ["PA", "NY", "VT", "ME", "NJ", "CT", "RI", "MA"],
+    "Midwest": ["ND", "SD", "NE", "KS", "MN", "IA", "MO", "WI", "IL", "MI", "IN", "OH"],
+    "South": ["TX", "OK", "AR", "LA", "MS", "AL", "TN", "KY", "FL", "GA", "SC", "NC", "VA", "WV", "DE", "MD"],
+    "West": ["AK", "HI", "WA", "OR", "CA", "AZ", "NM", "NV", "UT", "CO", "ID", "WY", "MT"]
+}
+
+# Dictionary containing the tuples for a given size
+SIZE_DICT = {
+    "0 to 500 (Very Small)" : (0, 500),
+    "500 to 1,000 (Small)" : (500, 1000),
+    "1,000 to 5,000 (Medium)" : (1000, 5000),
+    "5,000 to 10,000 (Large)" : (5000, 10000),
+    "10,000+ (Very Large)" : (10000, 500000)
+}
+
+# weight of each part of a college's score in ranked recommendations: how close its average GPA is 
+# to a little below the user's, its acceptance rate, how close its size is to the preferred size, 
+# and whether it is in a preferred region
+SCORE_WEIGHTS = {"gpa": 0.4, "acceptance": 0.2, "size": 0.2, "region": 0.2}
+# GPA difference below the user's GPA that scores best, and how fast the score drops around it
+SCORE_GPA_GAP = 0.1
+SCORE_GPA_SCALE = 0.3
+# colleges whose average GPA is at least this much below the user's are safeties, above it reaches
+SAFETY_GPA_GAP = 0.3
+# number of ranked recommendations shown on the website
+TOP_MATCHES = 10
+
+# words left out of college names before matching them, and words written in more than one way
+NAME_STOP_WORDS = {"the", "of", "and", "at", "in", "main", "campus"}
+NAME_SYNONYMS = {"saint": "st", "mount": "mt", "univ": "university", "coll": "college", 
+                 "inst": "institute", "ctr": "center"}
+# shortest word a typo is allowed in, shorter words such as "Baylor" and "Taylor" must be written the same
+MIN_TYPO_LENGTH = 7
+# file the match table is written to by "python application.py match"
+MATCHES_PATH = "college_matches.csv"
+MATCH_COLUMNS = ["Appily College", "College", "Confidence", "Method"]
+
+# miles per radian of the earth's surface
+EARTH_RADIUS_MILES = 3958.8
+# size in degrees of the latitude and longitude grid cells the spatial index groups colleges by
+SPATIAL_CELL_DEGREES = 1.0
+# distances the website can search within, in miles
+NEAR_MILES = ["25", "50", "100", "250", "500", "1000"]
+
+# columns of the merged data frame, in order
+MERGED_COLUMNS = ["index", "College", "City", "State", "Country", "Website", "GPA", "Acceptance Rate", 
+                  "Type of Institution", "Number of Students", "Latitude", "Longitude"]
+
+# prepared dataset shared by every website session, rebuilt only when the source files change, 
+# and the signature of the sources the last refresh failed on, which is not tried again
+_dataset_lock = threading.Lock()
+_dataset_cache = {"prepared": None, "failed_signature": None}
+
+
+def source_signature():
+    '''
+    Output: 
+    - list of [path, modification time, size] for each data source that exists, used to tell 
+    whether the prepared dataset is out of date
+    '''
+    signature = []
+    for path in (LOCATIONS_PATH, STATS_PATH, STATS_ARROW_PATH):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature.append([path, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def dataset_signature():
+    '''
+    Output: 
+    - signature of the data sources and of the prebuilt dataset, changes whenever either is rewritten
+    '''
+    signature = source_signature()
+    meta_path = os.path.join(ARTIFACT_PATH, "meta.json")
+    if os.path.exists(meta_path):
+        stat = os.stat(meta_path)
+        signature.append([meta_path, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def prepare_locations(df):
+    '''
+    Input: 
+    - data frame read from the Opendatasoft json file
+    
+    Output: 
+    - data frame cleaned by prepare_df with Latitude and Longitude columns instead of Coordinates, 
+    and a "Location Row" column numbering the rows so merged colleges can be put back in this order
+    '''
+    # use prepare_df function to clean the dataframe
+    colleges_locations = prepare_df(df)
+
+    # split each college's {"lon": ..., "lat": ...} coordinates into separate columns
+    coordinates = pd.DataFrame(colleges_locations["Coordinates"].tolist(), index=colleges_locations.index)
+
+    # Create "Latitude" column and assign latitude for each college to it
+    colleges_locations["Latitude"] = coordinates["lat"]
+
+    # Create "Longitude" column and assign longitude for each college to it
+    colleges_locations["Longitude"] = coordinates["lon"]
+
+    colleges_locations["Location Row"] = np.arange(len(colleges_locations))
+    return colleges_locations.drop(columns = ["Coordinates"])
+
+
+def normalize_name(name):
+    '''
+    Input: 
+    - college name
+    
+    Output: 
+    - lower case words of the name without punctuation, "&" written as "and", and words such as 
+    "the", "of", "main", and "campus" left out, so "Saint Mary's College-Main Campus" and 
+    "St. Marys College" are both "st marys college"
+    '''
+    name = name.lower().replace("&", " and ").replace("'", "")
+    words = re.findall(r"[a-z0-9]+", name)
+    return " ".join(NAME_SYNONYMS.get(word, word) for word in words if word not in NAME_STOP_WORDS)
+
+
+def name_trigrams(normalized):
+    '''
+    Input: 
+    - name returned by normalize_name
+    
+    Output: 
+    - set of every 3 characters in a row of the name, padded with spaces
+    '''
+    padded = " %s " % normalized
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def one_edit_apart(word, other):
+    '''
+    Input: 
+    - two different words
+    
+    Output: 
+    - True when one letter was added, left out, replaced, or swapped with the next one to turn 
+    one word into the other
+    '''
+    if abs(len(word) - len(other)) > 1:
+        return False
+    if len(word) > len(other):
+        word, other = other, word
+    start = 0
+    while start < len(word) and word[start] == other[start]:
+        start += 1
+    if len(word) < len(other):
+        return word[start:] == other[start + 1:]
+    swapped = word[start + 1:start + 2] + word[start:start + 1]
+    return word[start + 1:] == other[start + 1:] or (swapped == other[start:start + 2] and word[start + 2:] == other[start + 2:])
+
+
+def typo_apart(normalized, other):
+    '''
+    Input: 
+    - two different names returned by normalize_name
+    
+    Output: 
+    - True when the names have the same words in the same order except one word of at least 
+    MIN_TYPO_LENGTH letters with a typo, so "mercy colege" matches "mercy college" but 
+    "eastern michigan university" does not match "western michigan university"
+    '''
+    words, other_words = normalized.split(), other.split()
+    if len(words) != len(other_words):
+        return False
+    different = [(word, other) for word, other in zip(words, other_words) if word != other]
+    return (len(different) == 1 and max(len(word) for word in different[0]) >= MIN_TYPO_LENGTH 
+            and one_edit_apart(*different[0]))
+
+
+def typo_keys(normalized):
+    '''
+    Input: 
+    - name returned by normalize_name
+    
+    Output: 
+    - list of the name with one word long enough to have a typo replaced by "*", for each such 
+    word; two names that are typo_apart have one of these keys in common
+    '''
+    words = normalized.split()
+    # a word one letter shorter than MIN_TYPO_LENGTH can be a typo of a word of that length
+    return [" ".join(words[:i] + ["*"] + words[i + 1:]) 
+            for i, word in enumerate(words) if len(word) >= MIN_TYPO_LENGTH - 1]
+
+
+def build_name_index(location_names):
+    '''
+    Input: 
+    - college names of the Opendatasoft data frame
+    
+    Output: 
+    - dictionary holding each distinct name ("names") and its normalized form ("normalized"), 
+    the set of names ("exact"), and two inverted indexes to the positions of the names: one 
+    from each normalized name ("by_normalized") and one from each key of typo_keys ("postings")
+    '''
+    names = pd.unique(pd.Series(location_names, dtype=object))
+    normalized = [normalize_name(name) for name in names]
+    by_normalized = {}
+    postings = {}
+    for position, words in enumerate(normalized):
+        by_normalized.setdefault(words, []).append(position)
+        for key in typo_keys(words):
+            postings.setdefault(key, []).append(position)
+    return {"names": names, 
+            "normalized": normalized, 
+            "exact": set(names), 
+            "by_normalized": by_normalized, 
+            "postings": postings}
+
+
+def score_name(name_index, name):
+    '''
+    Input: 
+    - dictionary returned by build_name_index
+    - college name from Appily
+    
+    Output: 
+    - list of (Opendatasoft name, confidence, method) of the best matches of the name, empty when 
+    no name is similar enough
+    
+    A name written the same way is an "exact" match, and a name that is the same once normalized 
+    is a "normalized" match. Otherwise the names with one word different are looked up by 
+    typo_keys in the inverted index instead of comparing every pair of names, and the ones with 
+    a typo in that word are "fuzzy" matches. The confidence of a match is the share of trigrams 
+    both names have (Dice coefficient), and only the candidates with the highest confidence are kept.
+    When several different names are the best, such as "University Of Saint Thomas" and 
+    "University Of St. Thomas" in two states, they are all "ambiguous" matches with the 
+    confidence divided between them, which apply_matches leaves out.
+    '''
+    if name in name_index["exact"]:
+        return [(name, 1.0, "exact")]
+
+    normalized = normalize_name(name)
+    same = name_index["by_normalized"].get(normalized)
+    if same is not None:
+        return ambiguous_matches(name_index, same, 1.0, "normalized")
+
+    candidates = set()
+    for key in typo_keys(normalized):
+        candidates.update(name_index["postings"].get(key, []))
+
+    trigrams = name_trigrams(normalized)
+    best_score, best = 0, []
+    for position in sorted(candidates):
+        other = name_index["normalized"][position]
+        if not typo_apart(normalized, other):
+            continue
+        other_trigrams = name_trigrams(other)
+        score = 2 * len(trigrams & other_trigrams) / (len(trigrams) + len(other_trigrams))
+        if score > best_score:
+            best_score, best = score, [position]
+        elif score == best_score:
+            best.append(position)
+    return ambiguous_matches(name_index, best, best_score, "fuzzy")
+
+
+def ambiguous_matches(name_index, positions, confidence, method):
+    '''
+    Input: 
+    - dictionary returned by build_name_index
+    - positions of the best matching names in it, all with the confidence
+    - method of the matches, "normalized" or "fuzzy"
+    
+    Output: 
+    - list of (Opendatasoft name, confidence, method) returned by score_name: the match itself 
+    when there is one, otherwise every name as an "ambiguous" match with the confidence divided 
+    between them
+    '''
+    if len(positions) == 1:
+        return [(name_index["names"][positions[0]], round(confidence, 4), method)]
+    return [(name_index["names"][position], round(confidence / len(positions), 4), "ambiguous") 
+            for position in positions]
+
+
+def match_names(name_index, stats_names, scores=None):
+    '''
+    Input: 
+    - dictionary returned by build_name_index
+    - title cased college names from Appily
+    - dictionary of the results of score_name by Appily name, filled in and reused between calls 
+    with the same name index, or None
+    
+    Output: 
+    - match table with the Appily name, the Opendatasoft name, the confidence, and the method of 
+    every match; each Opendatasoft name keeps only its best match, exact matches first and 
+    ambiguous ones last
+    '''
+    rows = []
+    for name in pd.unique(pd.Series(stats_names, dtype=object)):
+        if scores is None:
+            found = score_name(name_index, name)
+        elif name in scores:
+            found = scores[name]
+        else:
+            found = scores[name] = score_name(name_index, name)
+        rows.extend((name, college, confidence, method) for college, confidence, method in found)
+    matches = pd.DataFrame(rows, columns=MATCH_COLUMNS)
+
+    rank = matches["Method"].map({"exact": 0, "normalized": 1, "fuzzy": 2, "ambiguous": 3}).to_numpy()
+    order = np.lexsort((np.arange(len(matches)), -matches["Confidence"].to_numpy(), rank))
+    matches = matches.iloc[order].drop_duplicates(subset=["College"]).sort_index()
+    return matches.reset_index(drop=True)
+
+
+def write_matches(matches, path=MATCHES_PATH):
+    '''
+    Input: 
+    - match table returned by match_names
+    - csv file to write it to
+    
+    Output: 
+    - writes the match table so matches can be reviewed, lowest confidence first
+    '''
+    matches.sort_values("Confidence", kind="stable").to_csv(path, index=False)
+
+
+def clean_stats(colleges_stats):
+    '''
+    Input: 
+    - data frame returned by read_stats made by web scraping Appily
+    
+    Output: 
+    - data frame with college names and acceptance rates written like the Opendatasoft data, ready to be merged
+    '''
+    colleges_stats = colleges_stats.copy()
+    colleges_stats["College"] = colleges_stats["College"].str.title()
+
+    # the item pipeline stores acceptance rates as numbers, shown like the csv's " 97%" or " --" when missing
+    acceptance_rate = colleges_stats["Acceptance Rate"]
+    if pd.api.types.is_numeric_dtype(acceptance_rate):
+        shown = " " + acceptance_rate.round().astype("Int64").astype(str) + "%"
+        colleges_stats["Acceptance Rate"] = shown.where(acceptance_rate.notna(), " --").astype(object)
+
+    # Strip whitespace before "Public" and "Private" in the column for "Type of Institution"
+    colleges_stats["Type of Institution"] = colleges_stats["Type of Institution"].astype(str).str.strip()
+
+    # numbers the rows so merged colleges listed on several GPA pages stay in this order
+    colleges_stats["Stats Row"] = np.arange(len(colleges_stats))
+    return colleges_stats
+
+
+def apply_matches(colleges_stats, matches):
+    '''
+    Input: 
+    - data frame returned by clean_stats
+    - match table returned by match_names
+    
+    Output: 
+    - rows of colleges_stats with a match, with each college named like the Opendatasoft data; 
+    ambiguous matches are left out, so one Appily college never gets joined to several colleges
+    '''
+    colleges_stats = colleges_stats.rename(columns = {"College": "Appily College"})
+    matches = matches[matches["Method"] != "ambiguous"]
+    matched = pd.merge(colleges_stats, matches[["Appily College", "College"]], on="Appily College")
+    return matched.drop(columns = ["Appily College"])
+
+
+def stats_hashes(colleges_stats):
+    '''
+    Input: 
+    - data frame returned by apply_matches
+    
+    Output: 
+    - series of a hash of the statistics of each college, over every row it has, indexed by college name
+    '''
+    row_hashes = pd.util.hash_pandas_object(colleges_stats.drop(columns = ["Stats Row"]), index=False)
+    return row_hashes.groupby(colleges_stats["College"].to_numpy(), sort=False).agg(lambda rows: hash(tuple(rows)))
+
+
+def join_stats(colleges_locations, colleges_stats):
+    '''
+    Input: 
+    - data frame returned by prepare_locations
+    - data frame returned by apply_matches
+    
+    Output: 
+    - every location row of a college joined with each row of its statistics
+    '''
+    # Merge dataframes from Opendatasoft and Appily
+    return pd.merge(colleges_locations, colleges_stats, on='College')
+
+
+def finish_merge(joined):
+    '''
+    Input: 
+    - data frame returned by join_stats, or several of them concatenated
+    
+    Output: 
+    - merged data frame of every college with its statistics, Latitude, and Longitude, in the 
+    order of the Opendatasoft data
+    '''
+    # same order as merging the whole data frames at once
+    data_merge = joined.sort_values(["Location Row", "Stats Row"]).reset_index(drop=True)
+    
+    # Drop duplicates for Website name
+    data_merge = data_merge.drop_duplicates(subset=['Website'])
+
+    # Reset index for the new merged data frame
+    data_merge = data_merge.reset_index()
+
+    return data_merge[MERGED_COLUMNS]
+
+
+def merge_datasets(colleges_locations, colleges_stats):
+    '''
+    Input: 
+    - data frame returned by prepare_locations
+    - data frame returned by read_stats made by web scraping Appily
+    
+    Output: 
+    - merged data frame of every college with its statistics, Latitude, and Longitude
+    '''
+    colleges_stats = clean_stats(colleges_stats)
+    matches = match_names(build_name_index(colleges_locations["College"]), colleges_stats["College"])
+    return finish_merge(join_stats(colleges_locations, apply_matches(colleges_stats, matches)))
+
+
+def read_stats():
+    '''
+    Output: 
+    - data frame of college statistics, memory-mapped from the Arrow file written by the scrapy 
+    item pipeline when there is one, otherwise read from colleges.csv
+    '''
+    if os.path.exists(STATS_ARROW_PATH):
+        # pyarrow is only needed when the crawl wrote an Arrow file
+        import pyarrow
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(STATS_ARROW_PATH)).read_all()
+        return table.to_pandas()
+    return pd.read_csv(STATS_PATH)
+
+
+def build_dataset():
+    '''
+    Output: 
+    - merged data frame built from scratch out of the Opendatasoft json file and the college statistics
+    '''
+    # pull data from Opendatasoft containing over 6000 colleges in the U.S. and US territories.
+    colleges_locations = prepare_locations(pd.read_json(LOCATIONS_PATH))
+
+    # read in the college statistics from web scraping Appily website 
+    colleges_stats = read_stats()
+
+    return merge_datasets(colleges_locations, colleges_stats)
+
+
+def refresh_sources(previous):
+    '''
+    Input: 
+    - dictionary of the sources returned by the last refresh_sources call, or None
+    
+    Output: 
+    - tuple of the merged data frame, the sources dictionary to pass to the next call, and a 
+    report of the refresh: the colleges added, changed, and removed, the merged rows added and 
+    removed for them, and the rows of the merged data frame
+    
+    The Opendatasoft json file is only parsed again when it changed. Otherwise only Appily names 
+    that were not seen before are matched, and each college's statistics are compared to the 
+    previous ones by hash, and only the colleges that were added, changed, or removed are merged 
+    again. The result is the same as build_dataset.
+    '''
+    start = time.perf_counter()
+    stat = os.stat(LOCATIONS_PATH)
+    locations_signature = [stat.st_mtime_ns, stat.st_size]
+    if previous is None or previous["locations_signature"] != locations_signature:
+        previous = None
+        colleges_locations = prepare_locations(pd.read_json(LOCATIONS_PATH))
+        name_index = build_name_index(colleges_locations["College"])
+        name_scores = {}
+    else:
+        colleges_locations = previous["locations"]
+        name_index = previous["name_index"]
+        name_scores = previous["name_scores"]
+
+    # only names not seen since the Opendatasoft data changed are scored
+    colleges_stats = clean_stats(read_stats())
+    matches = match_names(name_index, colleges_stats["College"], name_scores)
+    colleges_stats = apply_matches(colleges_stats, matches)
+    hashes = stats_hashes(colleges_stats)
+
+    if previous is None:
+        joined = join_stats(colleges_locations, colleges_stats)
+        report = {"mode": "full", "added": len(hashes), "changed": 0, "removed": 0, 
+                  "rows_added": len(joined), "rows_removed": 0}
+    else:
+        old_hashes = previous["hashes"]
+        added = hashes.index.difference(old_hashes.index)
+        removed = old_hashes.index.difference(hashes.index)
+        kept = hashes.index.intersection(old_hashes.index)
+        changed = kept[hashes[kept].to_numpy() != old_hashes[kept].to_numpy()]
+        report = {"mode": "incremental", "added": len(added), "changed": len(changed), "removed": len(removed)}
+
+        # drops the rows of changed and removed colleges, then merges changed and added colleges again
+        outdated = removed.append(changed)
+        updated = added.append(changed)
+        joined = previous["joined"]
+        outdated_rows = joined["College"].isin(outdated)
+        joined = joined[~outdated_rows]
+        new_rows = join_stats(colleges_locations[colleges_locations["College"].isin(updated)], 
+                              colleges_stats[colleges_stats["College"].isin(updated)])
+        if len(new_rows) > 0:
+            joined = pd.concat([joined, new_rows], ignore_index=True)
+        report["rows_added"] = len(new_rows)
+        report["rows_removed"] = int(outdated_rows.sum())
+
+    if previous is not None and report["added"] + report["changed"] + report["removed"] == 0:
+        data = previous["data"]
+    else:
+        data = finish_merge(joined)
+
+    sources = {"locations_signature": locations_signature, 
+               "locations": colleges_locations, 
+               "name_index": name_index, 
+               "name_scores": name_scores, 
+               "matches": matches, 
+               "hashes": hashes, 
+               "joined": joined, 
+               "data": data}
+    report["rows"] = len(data)
+    report["seconds"] = time.perf_counter() - start
+    return data, sources, report
+
+
+def write_artifact(data, path=ARTIFACT_PATH):
+    '''
+    Input: 
+    - merged data frame returned by build_dataset
+    - directory to write the prebuilt dataset to
+    
+    Output: 
+    - writes one .npy file per column plus a meta.json file describing the columns, so server 
+    processes can memory-map the columns instead of parsing and merging the data sources
+    
+    Every build writes new files named after the build, and never rewrites the files of an 
+    earlier build, since running servers may have memory-mapped them. meta.json is replaced in a 
+    single rename once all columns are written, so readers see either the old or the new build.
+    '''
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, "meta.json")
+    previous_build = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            previous_build = json.load(file).get("build")
+    build = "%x" % time.time_ns()
+
+    columns = []
+    for number, column in enumerate(data.columns):
+        dtype = ARTIFACT_DTYPES.get(column, "str")
+        entry = {"name": column, "file": "%s-col%d.npy" % (build, number), "dtype": dtype}
+        if dtype == "category":
+            # stores categories once and each row as a small integer code
+            values = data[column].astype("category")
+            entry["categories"] = [str(category) for category in values.cat.categories]
+            array = values.cat.codes.to_numpy().astype("int8")
+        elif dtype == "str":
+            # fixed width unicode so the column can be memory-mapped
+            array = data[column].astype(str).to_numpy().astype("U")
+        else:
+            array = data[column].to_numpy().astype(dtype)
+        np.save(os.path.join(path, entry["file"]), array)
+        columns.append(entry)
+
+    # meta.json is replaced last, so a half written build is never picked up
+    meta = {"build": build, "sources": source_signature(), "rows": len(data), "columns": columns}
+    with open(meta_path + ".tmp", "w") as file:
+        json.dump(meta, file)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    # removes older builds but keeps the previous one, which a reader may have just found in meta.json; 
+    # on posix, files a server already memory-mapped stay readable after they are removed
+    for name in os.listdir(path):
+        if name.endswith(".npy") and name.split("-")[0] not in (build, previous_build):
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+
+def read_artifact(path=ARTIFACT_PATH):
+    '''
+    Input: 
+    - directory written by write_artifact
+    
+    Output: 
+    - merged data frame whose numeric and category columns are memory-mapped from disk, so their 
+    pages are shared by every server process reading the same files
+    '''
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+    data = {}
+    for entry in meta["columns"]:
+        array = np.load(os.path.join(path, entry["file"]), mmap_mode="r")
+        if entry["dtype"] == "category":
+            data[entry["name"]] = pd.Categorical.from_codes(array, categories=entry["categories"])
+        elif entry["dtype"] == "str":
+            data[entry["name"]] = array.astype(object)
+        else:
+            data[entry["name"]] = array
+    return pd.DataFrame(data, copy=False)
+
+
+def read_dataset(previous_sources=None):
+    '''
+    Input: 
+    - sources dictionary of the last refresh_sources call, or None
+    
+    Output: 
+    - tuple of the merged data frame, the sources dictionary (None when the prebuilt dataset was 
+    used), and a report of how it was read; the prebuilt dataset is used when it was built from 
+    the current data sources, otherwise the data sources are merged by refresh_sources
+    '''
+    meta_path = os.path.join(ARTIFACT_PATH, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        # a dataset built with other column dtypes, such as float32 GPAs, is built again
+        same_dtypes = all(entry["dtype"] == ARTIFACT_DTYPES.get(entry["name"], "str") for entry in meta["columns"])
+        # a deployment may ship only the prebuilt dataset without the data sources
+        sources = source_signature()
+        if (meta["sources"] == sources and same_dtypes) or sources == []:
+            start = time.perf_counter()
+            data = read_artifact(ARTIFACT_PATH)
+            return data, None, {"mode": "artifact", "rows": len(data), "seconds": time.perf_counter() - start}
+    return refresh_sources(previous_sources)
+
+
+def college_regions(data):
+    '''
+    Input: 
+    - merged data frame returned by read_dataset
+    
+    Output: 
+    - array of the region of each college, None for states outside of every region
+    '''
+    region_of_state = {state: region for region, states in REGION_DICT.items() for state in states}
+    return np.asarray([region_of_state.get(state) for state in data["State"]], dtype=object)
+
+
+def build_filter_index(data):
+    '''
+    Input: 
+    - merged data frame returned by read_dataset
+    
+    Output: 
+    - dictionary mapping each (type of institution, region, size) to a tuple of the row positions 
+    of matching colleges sorted by GPA and their sorted GPAs, so a query only has to search the GPAs
+    '''
+    gpas = data["GPA"].to_numpy()
+    students = data["Number of Students"].to_numpy()
+    types = np.asarray(data["Type of Institution"], dtype=object)
+    regions = college_regions(data)
+
+    index = {}
+    for size, (lowerbound, upperbound) in SIZE_DICT.items():
+        in_size = (students >= lowerbound) & (students < upperbound)
+        for type_inst in pd.unique(types):
+            for region in REGION_DICT:
+                positions = np.flatnonzero(in_size & (types == type_inst) & (regions == region))
+                order = np.argsort(gpas[positions], kind="stable")
+                index[(type_inst, region, size)] = (positions[order], gpas[positions][order])
+    return index
+
+
+def build_spatial_index(latitudes, longitudes):
+    '''
+    Input: 
+    - latitude and longitude of every college in degrees
+    
+    Output: 
+    - dictionary holding the coordinates in radians ("latitude", "longitude"), the row positions 
+    of the colleges ordered by grid cell ("order"), and a dictionary from each grid cell with 
+    colleges to the start and end of its colleges in "order" ("cells"); cells are 
+    SPATIAL_CELL_DEGREES wide and numbered row by row from the south pole and the date line
+    '''
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    rows = int(np.ceil(180 / SPATIAL_CELL_DEGREES))
+    columns = int(np.ceil(360 / SPATIAL_CELL_DEGREES))
 
+    # colleges without coordinates are left out of the index
+    positions = np.flatnonzero(np.isfinite(latitudes) & np.isfinite(longitudes))
+    cell_rows = np.clip(np.floor((latitudes[positions] + 90) / SPATIAL_CELL_DEGREES), 0, rows - 1).astype(np.int64)
+    cell_columns = np.floor((longitudes[positions] + 180) / SPATIAL_CELL_DEGREES).astype(np.int64) % columns
+    keys = cell_rows * columns + cell_columns
 
-def Website():
+    order = np.argsort(keys, kind="stable")
+    cells, starts = np.unique(keys[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    return {"latitude": np.radians(latitudes), 
+            "longitude": np.radians(longitudes), 
+            "order": positions[order], 
+            "cells": dict(zip(cells.tolist(), zip(starts.tolist(), ends.tolist()))), 
+            "rows": rows, 
+            "columns": columns}
+
+
+def build_cluster_index(latitudes, longitudes):
     '''
-    Uses pywebio built-in functions to create a functional website where users can input GPA, preferred 
-    school type, preferred number of undergraduates in each grade level, and preferred region of study. 
-    Website outputs suggestions for schools to apply to in the form of an interactive plotly map and table.
+    Input: 
+    - latitude and longitude of every college in degrees
+    
+    Output: 
+    - dictionary mapping each of CLUSTER_ZOOMS to an array of the grid cell of every college at 
+    that zoom, -1 for colleges without coordinates; cells are CLUSTER_CELL_PIXELS wide on the 
+    web mercator map, so they look square at every latitude
     '''
-    put_markdown('### Answer a couple questions and we will tell you where to apply!'), put_markdown('# **Welcome to Your College Application Guide**') # sets website heading and subheading
-    with use_scope('scope1'):
-        # lets users select their gpa from drop-down menu
-        gpa = select("Select your GPA (Round for best approximation)：", ['4.0','3.9','3.8','3.7','3.6','3.5','3.4','3.3','3.2','3.1','3.0','2.9','2.8','2.7','2.6','2.5','2.4','2.3','2.2','2.1','2.0']) 
-        gpa = float(gpa)
-        # lets users choose preferred type of school via checkbox
-        school_type = checkbox("Private vs. Public：", options=['Private', 'Public'])
-        # lets users choose preferred number of undergraduates in each grade level via checkbox
-        num_undergrads = select("Number of undergraduates per grade：", ['0 to 500 (Very Small)', '500 to 1,000 (Small)', '1,000 to 5,000 (Medium)', '5,000 to 10,000 (Large)', '10,000+ (Very Large)'])
-        # shows map of different US regions
-        put_image('https://www.mappr.co/wp-content/uploads/2021/12/us-regions-map-census.jpg')
-        # lets users choose preferred region of study via checkbox
-        location = checkbox("Preferred region of study：", options=['West', 'Midwest', 'Northeast', 'South'])
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    located = np.isfinite(latitudes) & np.isfinite(longitudes)
+
+    # web mercator coordinates from 0 to 1 across the map, which is 512 pixels wide at zoom 0
+    x = (longitudes[located] + 180) / 360
+    y = 0.5 - np.log(np.tan(np.pi / 4 + np.radians(np.clip(latitudes[located], -85, 85)) / 2)) / (2 * np.pi)
+
+    cluster_index = {}
+    for zoom in CLUSTER_ZOOMS:
+        cells_across = int(np.ceil(512 * 2 ** zoom / CLUSTER_CELL_PIXELS))
+        columns = np.minimum(np.floor(x * cells_across), cells_across - 1).astype(np.int64)
+        rows = np.clip(np.floor(y * cells_across), 0, cells_across - 1).astype(np.int64)
+        cells = np.full(len(latitudes), -1, dtype=np.int64)
+        cells[located] = rows * cells_across + columns
+        cluster_index[zoom] = cells
+    return cluster_index
+
+
+def haversine_miles(latitude, longitude, latitudes, longitudes):
+    '''
+    Input: 
+    - latitude and longitude of a point in radians
+    - arrays of latitudes and longitudes in radians
     
-    with use_scope('scope1', clear=True):
-        # calls function for creating dataframe of suggested colleges per user inputs
-        college_table = college_recs(gpa, school_type, num_undergrads, location)
-        # calls function for creating map of suggested colleges per user inputs
-        college_map = college_recs_map(college_table)
-        # drops Latitude, Longitude, and unwanted index columns so they won't be displayed on website
-        college_table = college_table.drop(["Latitude", "Longitude", "index", "level_0"], axis=1)
-        
-        # converts 'college_map' plotly map to html for website
-        college_map_html = college_map.to_html(include_plotlyjs="require", full_html=False)
-        pywebio.output.put_html(college_map_html)
-        # converts 'college_table' dataframe to html for website
-        put_html(college_table.to_html(border=0, render_links=True))
-        
-def prepare_df(df):
-    '''Returns a cleaned data frame
-    Parameters: 
-        df: the data frame to be cleaned
-    Type: 
-        df: two dimensional data structure
-    Return: a cleaned data frame
+    Output: 
+    - array of the great circle distances in miles from the point to each of the coordinates
     '''
-    # selects only the columns we want to look at
-    df = df[["geo_point_2d","name", "city", "state", "country", "website"]]
-    # renames "name" column to "College" for future data merging purposes
-    df = df.rename(columns={"geo_point_2d":"Coordinates", "name": "College", "city":"City", "state":"State", "country":"Country", "website":"Website"})
+    a = (np.sin((latitudes - latitude) / 2) ** 2 
+         + np.cos(latitude) * np.cos(latitudes) * np.sin((longitudes - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def cell_candidates(spatial_index, latitude, longitude, miles):
+    '''
+    Input: 
+    - dictionary returned by build_spatial_index
+    - latitude and longitude of a point in degrees
+    - distance in miles
     
-    # turns columns from all caps to having only first letter of each word capitalized
-    df["College"] = df["College"].apply(lambda x: x.title())
-    df["City"] = df["City"].apply(lambda x: x.title())
+    Output: 
+    - row positions of the colleges in every grid cell that may hold a college within the 
+    distance of the point
+    '''
+    # no point is farther than half way around the earth, which also keeps the span finite
+    span = np.degrees(min(miles, np.pi * EARTH_RADIUS_MILES) / EARTH_RADIUS_MILES)
+    columns = spatial_index["columns"]
+    low_row = max(0, int(np.floor((latitude - span + 90) / SPATIAL_CELL_DEGREES)))
+    high_row = min(spatial_index["rows"] - 1, int(np.floor((latitude + span + 90) / SPATIAL_CELL_DEGREES)))
+    if abs(latitude) + span >= 90 or span >= 90:
+        # the distance reaches a pole, so every longitude can be within it
+        cell_columns = range(columns)
+    else:
+        # widest difference in longitude of points within the distance
+        longitude_span = np.degrees(np.arcsin(np.sin(np.radians(span)) / np.cos(np.radians(latitude))))
+        low_column = int(np.floor((longitude - longitude_span + 180) / SPATIAL_CELL_DEGREES))
+        high_column = int(np.floor((longitude + longitude_span + 180) / SPATIAL_CELL_DEGREES))
+        cell_columns = range(low_column, min(high_column, low_column + columns - 1) + 1)
+
+    # scans every college instead when there are more cells to look up than cells with colleges
+    if (high_row - low_row + 1) * len(cell_columns) > len(spatial_index["cells"]):
+        return spatial_index["order"]
+    order, cells = spatial_index["order"], spatial_index["cells"]
+    parts = []
+    for row in range(low_row, high_row + 1):
+        for column in cell_columns:
+            cell = cells.get(row * columns + column % columns)
+            if cell is not None:
+                parts.append(order[cell[0]:cell[1]])
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+
+def radius_positions(spatial_index, latitude, longitude, miles, allowed=None):
+    '''
+    Input: 
+    - dictionary returned by build_spatial_index
+    - latitude and longitude of a point in degrees
+    - distance in miles
+    - boolean array of the colleges that may be returned, or None for every college
     
-    # finds index of rows in df where colleges are not in the US
-    not_USA_colleges = df[(df['Country'] != 'USA')].index 
+    Output: 
+    - sorted array of the row positions of the colleges within the distance of the point
+    '''
+    candidates = cell_candidates(spatial_index, latitude, longitude, miles)
+    if allowed is not None:
+        candidates = candidates[allowed[candidates]]
+    distances = haversine_miles(np.radians(latitude), np.radians(longitude), 
+                                spatial_index["latitude"][candidates], spatial_index["longitude"][candidates])
+    return np.sort(candidates[distances <= miles])
+
+
+def nearest_positions(spatial_index, latitude, longitude, count, allowed=None, miles=None):
+    '''
+    Input: 
+    - dictionary returned by build_spatial_index
+    - latitude and longitude of a point in degrees
+    - number of colleges to return
+    - boolean array of the colleges that may be returned, or None for every college
+    - distance in miles the colleges must be within, or None for any distance
     
-    # delete these row indexes from dataFrame
-    df = df.drop(not_USA_colleges)
+    Output: 
+    - sorted array of the row positions of the count colleges nearest to the point, colleges at 
+    the same distance are taken in dataset order
     
-    # makes every website link https for later user functionality purposes
-    new_websites = [] # empty list
-    # loops through each website in dataframe
-    # if the website does not already start with "https://" this will be added to start of link
-    for website in df["Website"]:
-        if (website.startswith("https://") == False) and (website.startswith("NOT") == False):
-            website = 'https://' + website
-            new_websites.append(website)
+    Searches a distance of one grid cell first and doubles it until it holds count colleges, 
+    since the nearest colleges are then all within it.
+    '''
+    # no two points are further apart than half way around the earth
+    largest = np.pi * EARTH_RADIUS_MILES if miles is None else min(miles, np.pi * EARTH_RADIUS_MILES)
+    radius = min(np.radians(SPATIAL_CELL_DEGREES) * EARTH_RADIUS_MILES, largest)
+    while True:
+        candidates = cell_candidates(spatial_index, latitude, longitude, radius)
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        distances = haversine_miles(np.radians(latitude), np.radians(longitude), 
+                                    spatial_index["latitude"][candidates], spatial_index["longitude"][candidates])
+        inside = distances <= radius
+        if inside.sum() >= count or radius >= largest:
+            candidates, distances = candidates[inside], distances[inside]
+            nearest = np.lexsort((candidates, distances))[:count]
+            return np.sort(candidates[nearest])
+        radius = min(radius * 2, largest)
+
+
+def build_prepared(data, signature, version, sources, report):
+    '''
+    Input: 
+    - merged data frame returned by read_dataset
+    - signature of the data sources it was read from, returned by dataset_signature
+    - version number of the data
+    - sources dictionary and report returned with the data by read_dataset
+    
+    Output: 
+    - dictionary returned by load_prepared for the data, with its indexes built and an empty 
+    positions cache
+    '''
+    return {"signature": signature, 
+            "version": version, 
+            "data": data, 
+            "index": build_filter_index(data), 
+            "spatial": build_spatial_index(data["Latitude"], data["Longitude"]), 
+            "clusters": build_cluster_index(data["Latitude"], data["Longitude"]), 
+            "sort_keys": build_sort_keys(data), 
+            "score_columns": build_score_columns(data), 
+            "positions": RenderCache(POSITIONS_CACHE_ENTRIES, POSITIONS_CACHE_ROWS), 
+            "sources": sources, 
+            "refresh": report}
+
+
+def load_prepared():
+    '''
+    Output: 
+    - dictionary holding the merged data frame ("data"), its filter index ("index"), spatial 
+    index ("spatial"), and map cluster cells ("clusters"), a version number that goes up every 
+    time the data changes ("version"), the numeric values the table can be sorted by 
+    ("sort_keys") and colleges are scored by ("score_columns"), a RenderCache of the positions of 
+    the colleges matching recent queries ("positions"), and a report of the last refresh ("refresh")
+    
+    The data is built on first use and refreshed when the modification time or size of a data 
+    source or of the prebuilt dataset changes. While one thread refreshes it, the others keep 
+    using the previous data, which is then swapped for the new data in a single assignment. When 
+    a refresh fails, the error is logged and the previous data is kept until a source changes again. 
+    Everything returned is shared by all website sessions, so callers must not modify it in place.
+    '''
+    signature = dataset_signature()
+    prepared = _dataset_cache["prepared"]
+    if prepared is not None and signature in (prepared["signature"], _dataset_cache["failed_signature"]):
+        return prepared
+
+    # only one thread refreshes the dataset; the others keep serving the old one, or wait when there is none
+    if not _dataset_lock.acquire(blocking=prepared is None):
+        return prepared
+    try:
+        prepared = _dataset_cache["prepared"]
+        if prepared is None or signature not in (prepared["signature"], _dataset_cache["failed_signature"]):
+            previous_sources = None if prepared is None else prepared["sources"]
+            try:
+                data, sources, report = read_dataset(previous_sources)
+            except Exception:
+                # with no previous data there is nothing to serve, so the error reaches the caller
+                if prepared is None:
+                    raise
+                logger.exception("could not refresh the dataset, serving version %d until a data source changes again", 
+                                 prepared["version"])
+                _dataset_cache["failed_signature"] = signature
+                return prepared
+            logger.info("refreshed dataset: %s", report)
+            _dataset_cache["failed_signature"] = None
+            if prepared is not None and data is prepared["data"]:
+                # nothing changed, so the index and every cached query stay valid
+                prepared = dict(prepared, signature=signature, sources=sources, refresh=report)
+            else:
+                version = 1 if prepared is None else prepared["version"] + 1
+                prepared = build_prepared(data, signature, version, sources, report)
+            # replaced in a single assignment so readers never see a half updated dataset
+            _dataset_cache["prepared"] = prepared
+        return prepared
+    finally:
+        _dataset_lock.release()
+
+
+def load_dataset():
+    '''
+    Output: 
+    - merged data frame shared by all website sessions, see load_prepared
+    '''
+    return load_prepared()["data"]
+
+
+def normalize_query(gpa_input, type_inst_input, size_input, location_input, near_input=None):
+    '''
+    Input: 
+    - the same inputs as college_recs
+    
+    Output: 
+    - hashable tuple that is the same for every ordering of the selected types and regions
+    '''
+    if near_input is not None:
+        latitude, longitude, miles, count = near_input
+        near_input = (float(latitude), 
+                      float(longitude), 
+                      None if miles is None else float(miles), 
+                      None if count is None else int(count))
+    return (float(gpa_input), 
+            tuple(sorted(set(type_inst_input))), 
+            size_input, 
+            tuple(sorted(set(location_input))), 
+            near_input)
+
+
+def query_positions(prepared, query):
+    '''
+    Input: 
+    - dictionary returned by load_prepared
+    - query tuple returned by normalize_query
+    
+    Output: 
+    - sorted array of the row positions of colleges matching the query
+    '''
+    cached = prepared["positions"].get(prepared["version"], query)
+    if cached is not None:
+        return cached[0]
+
+    gpa_input, type_inst_input, size_input, location_input, near_input = query
+    if near_input is not None:
+        # colleges matching the other inputs, then the ones near the point among them
+        allowed = np.zeros(len(prepared["data"]), dtype=bool)
+        allowed[query_positions(prepared, query[:4] + (None,))] = True
+        latitude, longitude, miles, count = near_input
+        if count is None:
+            positions = radius_positions(prepared["spatial"], latitude, longitude, miles, allowed)
         else:
-            new_websites.append(website)
-    # "Website" column of dataframe is updated with https websites
-    df["Website"] = new_websites 
+            positions = nearest_positions(prepared["spatial"], latitude, longitude, count, allowed, miles)
+        prepared["positions"].put(prepared["version"], query, (positions,))
+        return positions
+
+    # raises KeyError for unknown sizes and regions, like looking them up in the dictionaries
+    SIZE_DICT[size_input]
+    parts = []
+    for region in location_input:
+        REGION_DICT[region]
+        for type_inst in type_inst_input:
+            entry = prepared["index"].get((type_inst, region, size_input))
+            if entry is not None:
+                sorted_positions, sorted_gpas = entry
+                # compares in the GPA column's own dtype, like data_merge["GPA"] <= gpa_input
+                cutoff = np.searchsorted(sorted_gpas, sorted_gpas.dtype.type(gpa_input), side="right")
+                parts.append(sorted_positions[:cutoff])
+
+    # keeps colleges in the same order as the merged data frame
+    positions = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+    prepared["positions"].put(prepared["version"], query, (positions,))
+    return positions
+
+
+def build_sort_keys(data):
+    '''
+    Input: 
+    - merged data frame returned by read_dataset
     
-    return(df)
+    Output: 
+    - dictionary mapping each column in SORT_COLUMNS to a float array of its values, with 
+    acceptance rates such as " 97%" turned into numbers
+    '''
+    sort_keys = {}
+    for column in SORT_COLUMNS.values():
+        values = data[column]
+        if column == "Acceptance Rate":
+            values = pd.to_numeric(values.astype(str).str.strip().str.rstrip("%"), errors="coerce")
+        sort_keys[column] = values.to_numpy(dtype="float64")
+    return sort_keys
 
-def college_recs(gpa_input, type_inst_input, size_input, location_input):
+
+def sorted_positions(prepared, query, sort_by=None, descending=False):
     '''
     Input: 
-    - gpa input (select one value from 2.0 to 4.0 incremented by 0.1)
-    - type of institution input (select one or more from public, private)
-    - size input (select one value from 0 to 500, 500 to 1,000, 1,000 to 5,000, 5,000 to 10,000, or 10,000+)
-    - location input (select one or more from Northeast, Midwest, South, West)
+    - dictionary returned by load_prepared
+    - query tuple returned by normalize_query
+    - sort_by: None to keep dataset order, or a key of SORT_COLUMNS
+    - descending: whether to sort from the largest to the smallest value
     
     Output: 
-    - data frame with values for gpa, type of institution, size, location corresponding to user's 
-    inputted selections
+    - array of the row positions of colleges matching the query in the requested order, colleges 
+    missing the sorted value come last
+    '''
+    positions = query_positions(prepared, query)
+    if sort_by is None:
+        return positions
+    keys = prepared["sort_keys"][SORT_COLUMNS[sort_by]][positions]
+    if descending:
+        keys = -keys
+    return positions[np.argsort(keys, kind="stable")]
+
+
+def build_score_columns(data):
     '''
+    Input: 
+    - merged data frame returned by read_dataset
     
-    # pull data from Opendatasoft containing over 6000 colleges in the U.S. and US territories.
-    df = pd.read_json("us-colleges-and-universities.json")
+    Output: 
+    - dictionary of the arrays score_colleges uses: the distinct GPAs ("gpa_values") and the 
+    code of each college's GPA among them ("gpa"), acceptance rate from 0 to 1 with 0.5 for 
+    unknown rates ("acceptance"), the size part of the score for each size ("size_scores"), and 
+    codes of the region and type of institution ("region", "type") with the names of the codes 
+    ("region_names", "type_names")
+    '''
+    sort_keys = build_sort_keys(data)
+    acceptance = sort_keys["Acceptance Rate"] / 100
 
-    # use prepare_df function to clean the dataframe
-    colleges_locations = prepare_df(df)
+    # GPAs are rounded to a tenth, so the GPA part of a score is computed once per distinct GPA
+    gpa_values, gpa_codes = np.unique(sort_keys["GPA"], return_inverse=True)
 
-    # read in colleges.csv from web scraping Appily website 
-    colleges_stats = pd.read_csv("colleges.csv")
-    colleges_stats["College"] = colleges_stats["College"].apply(lambda x: x.title())
+    # one for colleges of the preferred size, dropping with the ratio of their size to it
+    log_students = np.log(np.maximum(sort_keys["Number of Students"], 1))
+    size_scores = {}
+    for size, (lowerbound, upperbound) in SIZE_DICT.items():
+        distance = np.maximum(np.log(max(lowerbound, 1)) - log_students, 0) + np.maximum(log_students - np.log(upperbound), 0)
+        size_scores[size] = np.exp(-distance)
 
-    # Merge dataframes from Opendatasoft and Appily
-    data_merge = pd.merge(colleges_locations, colleges_stats, on='College')
+    # codes instead of names, so selected regions and types are looked up in a small table
+    regions = pd.Categorical(college_regions(data), categories=list(REGION_DICT))
+    types = pd.Categorical(np.asarray(data["Type of Institution"], dtype=object))
+    return {"gpa_values": gpa_values, 
+            "gpa": gpa_codes.reshape(-1), 
+            "acceptance": np.where(np.isnan(acceptance), 0.5, acceptance), 
+            "size_scores": size_scores, 
+            "region": regions.codes, 
+            "region_names": list(regions.categories), 
+            "type": types.codes, 
+            "type_names": list(types.categories)}
+
+
+def selected_codes(codes, names, selected):
+    '''
+    Input: 
+    - array of codes from build_score_columns, -1 for no name
+    - names of the codes
+    - selected names
     
-    # Drop duplicates for Website name
-    data_merge = data_merge.drop_duplicates(subset=['Website'])
+    Output: 
+    - boolean array of whether the name of each code was selected
+    '''
+    # the last entry is looked up by code -1
+    table = np.zeros(len(names) + 1, dtype=bool)
+    table[[number for number, name in enumerate(names) if name in selected]] = True
+    return table[codes]
+
+
+def score_colleges(score_columns, gpa_input, size_input, location_input, weights=None):
+    '''
+    Input: 
+    - dictionary returned by build_score_columns
+    - the GPA, size, and location inputs of college_recs
+    - dictionary of the weights of the parts of the score, SCORE_WEIGHTS when None
     
-    # Strip whitespace before "Public" and "Private" in the column for "Type of Institution"
-    data_merge["Type of Institution"] = data_merge["Type of Institution"].apply(lambda x: x.strip())
+    Output: 
+    - array of the score of every college from 0 to 1, computed for all colleges at once
+    '''
+    weights = SCORE_WEIGHTS if weights is None else weights
+    total = sum(weights.values())
+    # best a little below the user's GPA, lower for reaches above it and for colleges far below it
+    gap = gpa_input - score_columns["gpa_values"]
+    gpa_score = np.nan_to_num(np.exp(-((gap - SCORE_GPA_GAP) / SCORE_GPA_SCALE) ** 2))
+    # the weights of the GPA and region parts are put in their lookup tables
+    gpa_table = weights["gpa"] / total * gpa_score
+    region_table = np.zeros(len(score_columns["region_names"]) + 1)
+    region_table[[number for number, region in enumerate(score_columns["region_names"]) if region in location_input]] = weights["region"] / total
 
-    # Reset index for the new merged data frame
-    data_merge = data_merge.reset_index()
+    score = gpa_table[score_columns["gpa"]]
+    score += region_table[score_columns["region"]]
+    score += weights["acceptance"] / total * score_columns["acceptance"]
+    score += weights["size"] / total * score_columns["size_scores"][size_input]
+    return score
 
-    # Dictionary containing all the states in a given region
-    region_dict = {
-        "Northeast": ["PA", "NY", "VT", "ME", "NJ", "CT", "RI", "MA"],
-        "Midwest": ["ND", "SD", "NE", "KS", "MN", "IA", "MO", "WI", "IL", "MI", "IN", "OH"],
-        "South": ["TX", "OK", "AR", "LA", "MS", "AL", "TN", "KY", "FL", "GA", "SC", "NC", "VA", "WV", "DE", "MD"],
-        "West": ["AK", "HI", "WA", "OR", "CA", "AZ", "NM", "NV", "UT", "CO", "ID", "WY", "MT"]
-    }
-    
-    # Dictionary containing the tuples for a given size
-    size_dict = {
-        "0 to 500 (Very Small)" : (0, 500),
-        "500 to 1,000 (Small)" : (500, 1000),
-        "1,000 to 5,000 (Medium)" : (1000, 5000),
-        "5,000 to 10,000 (Large)" : (5000, 10000),
-        "10,000+ (Very Large)" : (10000, 500000)
-    }
-    
-    # list of states in the user's inputted region choice 
-    # for loop allows for multiple region selections
-    states_in_region = []
-    for region in location_input:
-        states_in_region = states_in_region + region_dict[region]
 
-    # assign lower size value to first value in size tuple
-    # assign upper size value to second value in size tuple
-    lowerbound, upperbound = size_dict[size_input]
+def top_positions(prepared, gpa_input, type_inst_input, size_input, location_input, count, weights=None):
+    '''
+    Input: 
+    - dictionary returned by load_prepared
+    - the GPA, type of institution, size, and location inputs of college_recs
+    - number of colleges to return
+    - dictionary of the weights of the parts of the score, SCORE_WEIGHTS when None
+    
+    Output: 
+    - tuple of the row positions of the count best scoring colleges of the selected types, best 
+    first, and their scores; only those colleges are sorted, the others are just partitioned off
+    '''
+    score_columns = prepared["score_columns"]
+    score = score_colleges(score_columns, gpa_input, size_input, location_input, weights)
+    # colleges of other types are never recommended
+    score[~selected_codes(score_columns["type"], score_columns["type_names"], type_inst_input)] = -np.inf
+    count = min(count, int(np.isfinite(score).sum()))
+    if count == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+    best = np.argpartition(-score, count - 1)[:count]
+    # highest score first, colleges with the same score in dataset order
+    best = best[np.lexsort((best, -score[best]))]
+    return best, score[best]
 
-    # initialize lists for latitude and longitude
-    lat = []
-    lon = []
 
-    # loop through each row in data_merge data frame and extract the latitude and longitude for each college
-    for i in range(0, data_merge.shape[0]):
-        for key, value in data_merge["Coordinates"][i].items():
-            if key == "lat":
-                lat.append(value)
-            if key == "lon":
-                lon.append(value)
+def college_rankings(gpa_input, type_inst_input, size_input, location_input, count=TOP_MATCHES, weights=None):
+    '''
+    Input: 
+    - the GPA, type of institution, size, and location inputs of college_recs
+    - number of colleges to return
+    - dictionary of the weights of the parts of the score, SCORE_WEIGHTS when None
+    
+    Output: 
+    - data frame of the count colleges that best fit the inputs, best first, with their "Score" 
+    and whether they are a "Reach", "Match", or "Safety" ("Fit"); unlike college_recs it also 
+    ranks colleges above the user's GPA and outside the preferred size and regions
+    '''
+    prepared = load_prepared()
+    positions, scores = top_positions(prepared, float(gpa_input), type_inst_input, size_input, location_input, 
+                                      count, weights)
+    rankings = prepared["data"].iloc[positions].reset_index(drop=True)
+    gap = float(gpa_input) - prepared["data"]["GPA"].to_numpy(dtype=np.float64)[positions]
+    rankings["Score"] = np.round(scores * 100).astype(int)
+    rankings["Fit"] = np.where(gap < 0, "Reach", np.where(gap >= SAFETY_GPA_GAP, "Safety", "Match"))
+    return rankings
 
-    # Create "Latitude" column and assign latitude for each college to it
-    data_merge["Latitude"] = lat
 
-    # Create "Longitude" column and assign longitude for each college to it
-    data_merge["Longitude"] = lon
-                
-    # Drop "Coordinates" column from final data frame
-    final_data = data_merge.drop(columns = ["Coordinates"])
+def college_recs(gpa_input, type_inst_input, size_input, location_input, near_input=None):
+    '''
+    Input: 
+    - gpa input (select one value from 2.0 to 4.0 incremented by 0.1)
+    - type of institution input (select one or more from public, private)
+    - size input (select one value from 0 to 500, 500 to 1,000, 1,000 to 5,000, 5,000 to 10,000, or 10,000+)
+    - location input (select one or more from Northeast, Midwest, South, West)
+    - near input (optional tuple of latitude, longitude, distance in miles or None, and number of 
+    nearest colleges or None) to keep only the colleges within the distance of the point, or the 
+    nearest ones
+    
+    Output: 
+    - data frame with values for gpa, type of institution, size, location corresponding to user's 
+    inputted selections
+    '''
+    
+    # merged and cleaned data from Opendatasoft and Appily, prepared once per process
+    with span("load"):
+        prepared = load_prepared()
 
     # Output GPA, Type of Institution, State, Number of Students, corresponding to user's 
     # inputted selections in the final data frame
-    final_data = final_data[(data_merge["GPA"] <= gpa_input) & 
-                            (data_merge["Type of Institution"].isin(type_inst_input)) & 
-                            (data_merge["State"].isin(states_in_region)) &
-                            (data_merge["Number of Students"] >= lowerbound) & 
-                            (data_merge["Number of Students"] < upperbound)]
+    query = normalize_query(gpa_input, type_inst_input, size_input, location_input, near_input)
+    with span("filter"):
+        final_data = prepared["data"].iloc[query_positions(prepared, query)]
 
     # Reset index for final data frame
     final_data = final_data.reset_index()
@@ -187,6 +2042,7 @@ def college_recs_map(df):
     location (using Latitude and Longitude) columns of the data frame
     - hovering over each point shows the college's GPA, City, State, Acceptance Rate, and Type of Institution
     '''
+    from plotly import express as px
 
     # Create a scatter mapbox using plotly express
     fig = px.scatter_mapbox(df,
@@ -216,5 +2072,385 @@ def college_recs_map(df):
     # Return map figure
     return fig
 
+def college_recs_map_compact(df):
+    '''
+    Input: 
+    - data frame with user's ideal college recommendations according to their inputted preferences
+    
+    Output: 
+    - the same map as college_recs_map, but its figure only carries the hover fields that are 
+    shown, coordinates rounded to 5 decimals (about 1 meter), and no layout template, so its html 
+    is much smaller
+    '''
+    from plotly import graph_objects as go
+
+    # Data revealed upon hovering over the college point, in the order they are shown
+    hover_columns = ["Number of Students", "GPA", "City", "State", "Acceptance Rate", "Type of Institution"]
+    hover_data = df[hover_columns]
+
+    latitude = df["Latitude"].astype("float64").round(5)
+    longitude = df["Longitude"].astype("float64").round(5)
+    students = df["Number of Students"].to_numpy()
+
+    hovertemplate = "<b>%{hovertext}</b><br><br>" + "<br>".join(
+        "%s=%%{customdata[%d]}" % (column, number) for number, column in enumerate(hover_columns)) + "<extra></extra>"
+
+    # Size of point differs by the size of the college, scaled like plotly express with size_max = 10
+    sizeref = 2.0 * students.max() / (10 ** 2) if len(students) > 0 and students.max() > 0 else 1
+
+    fig = go.Figure(go.Scattermapbox(lat = latitude, 
+                                     lon = longitude, 
+                                     mode = "markers", 
+                                     hovertext = df["College"], 
+                                     customdata = hover_data.to_numpy(), 
+                                     hovertemplate = hovertemplate, 
+                                     marker = {"size": students, 
+                                               "sizemode": "area", 
+                                               "sizeref": sizeref, 
+                                               "color": "#636efa"}, 
+                                     opacity = 0.8, 
+                                     showlegend = False))
+
+    # centers the map on the colleges like plotly express does
+    mapbox = {"style": "carto-positron", "zoom": 2}
+    if len(df) > 0:
+        mapbox["center"] = {"lat": round(float(latitude.mean()), 5), "lon": round(float(longitude.mean()), 5)}
+    fig.update_layout(template = "none", 
+                      mapbox = mapbox, 
+                      height = 300, 
+                      margin = {"r":0, "t":0, "l":0, "b":0})
+
+    # Return map figure
+    return fig
+
+def college_recs_map_clustered(prepared, positions):
+    '''
+    Input: 
+    - dictionary returned by load_prepared
+    - row positions of the recommended colleges
+    
+    Output: 
+    - map with one point per grid cell holding recommended colleges, at the mean location of its 
+    colleges and sized by their number; hovering over a point shows the number of colleges and 
+    their mean GPA, or the college's name when it is the only one
+    - the map has one trace per zoom level of CLUSTER_ZOOMS, and only the first is visible until 
+    cluster_zoom_script switches them
+    '''
+    from plotly import graph_objects as go
+
+    data = prepared["data"]
+    latitudes = data["Latitude"].to_numpy(dtype=np.float64)
+    longitudes = data["Longitude"].to_numpy(dtype=np.float64)
+    gpas = data["GPA"].to_numpy(dtype=np.float64)
+    names = np.asarray(data["College"], dtype=object)
+
+    traces = []
+    for level, zoom in enumerate(CLUSTER_ZOOMS):
+        cells = prepared["clusters"][zoom][positions]
+        located = positions[cells >= 0]
+        # groups the colleges by cell, first is the first college of each cell
+        _, first, groups = np.unique(cells[cells >= 0], return_index=True, return_inverse=True)
+        counts = np.bincount(groups)
+        latitude = np.bincount(groups, weights=latitudes[located]) / counts
+        longitude = np.bincount(groups, weights=longitudes[located]) / counts
+        mean_gpa = np.bincount(groups, weights=gpas[located]) / counts
+
+        labels = np.where(counts == 1, names[located[first]], 
+                          np.char.add(counts.astype(str), " colleges").astype(object))
+        # Size of point differs by the number of colleges, scaled like plotly express with size_max = 30
+        sizeref = 2.0 * counts.max() / (30 ** 2) if len(counts) > 0 else 1
+        traces.append(go.Scattermapbox(lat = latitude.round(5), 
+                                       lon = longitude.round(5), 
+                                       mode = "markers", 
+                                       hovertext = labels, 
+                                       customdata = mean_gpa.round(2), 
+                                       hovertemplate = "<b>%{hovertext}</b><br><br>Mean GPA=%{customdata}<extra></extra>", 
+                                       marker = {"size": counts, 
+                                                 "sizemode": "area", 
+                                                 "sizeref": sizeref, 
+                                                 "sizemin": 4, 
+                                                 "color": "#636efa"}, 
+                                       opacity = 0.8, 
+                                       visible = level == 0, 
+                                       showlegend = False))
+
+    fig = go.Figure(traces)
+    # centers the map on the colleges like plotly express does
+    mapbox = {"style": "carto-positron", "zoom": CLUSTER_ZOOMS[0]}
+    located = positions[np.isfinite(latitudes[positions]) & np.isfinite(longitudes[positions])]
+    if len(located) > 0:
+        mapbox["center"] = {"lat": round(float(latitudes[located].mean()), 5), 
+                            "lon": round(float(longitudes[located].mean()), 5)}
+    fig.update_layout(template = "none", 
+                      mapbox = mapbox, 
+                      height = 300, 
+                      margin = {"r":0, "t":0, "l":0, "b":0})
+
+    # Return map figure
+    return fig
+
+
+def cluster_zoom_script():
+    '''
+    Output: 
+    - javascript run after plotly draws a map from college_recs_map_clustered, which shows the 
+    trace of the zoom level the user zoomed to
+    '''
+    return '''
+    var plot = document.getElementById("{plot_id}");
+    var zooms = %s;
+    var shown = 0;
+    plot.on("plotly_relayout", function(event) {
+        if (!("mapbox.zoom" in event)) return;
+        var level = 0;
+        for (var i = 1; i < zooms.length; i++) {
+            if (event["mapbox.zoom"] >= zooms[i]) level = i;
+        }
+        if (level == shown) return;
+        shown = level;
+        Plotly.restyle(plot, {visible: zooms.map(function(zoom, i) { return i == level; })});
+    });''' % json.dumps(CLUSTER_ZOOMS)
+
+
+# columns the recommendation api can return, in the order they are returned
+API_FIELDS = ["College", "City", "State", "Country", "Website", "GPA", "Acceptance Rate", 
+              "Type of Institution", "Number of Students", "Latitude", "Longitude"]
+
+# short names the api accepts for each size, such as "very-small" for "0 to 500 (Very Small)"
+SIZE_NAMES = {size.split("(")[1].rstrip(")").lower().replace(" ", "-"): size for size in SIZE_DICT}
+
+# most colleges the api returns in one response
+API_MAX_LIMIT = 1000
+
+
+def api_response(prepared, query, fields, limit, offset, ndjson):
+    '''
+    Input: 
+    - dictionary returned by load_prepared
+    - query tuple returned by normalize_query
+    - fields: list of API_FIELDS to return
+    - limit, offset: number of colleges to return and how many matching colleges to skip first
+    - ndjson: True to return one json object per line instead of a single json document
+    
+    Output: 
+    - response body with the requested slice of colleges matching the query
+    '''
+    with span("filter"):
+        positions = query_positions(prepared, query)
+    record_rows("api", len(positions))
+    colleges = prepared["data"].iloc[positions[offset:offset + limit]][fields]
+    with span("serialize"):
+        if ndjson:
+            return colleges.to_json(orient="records", lines=True)
+        records = colleges.to_json(orient="records")
+        return '{"total": %d, "offset": %d, "limit": %d, "colleges": %s}' % (len(positions), offset, limit, records)
+
+
+def etag_matches(if_none_match, etag):
+    '''Returns whether the If-None-Match header if_none_match lists etag, compared weakly like tornado does'''
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+class CollegesHandler(tornado.web.RequestHandler):
+    '''
+    GET /api/colleges returns the colleges college_recs would recommend, as json.
+    
+    Query parameters: gpa (required), type and region (repeated or comma separated), size (a key 
+    of SIZE_DICT or SIZE_NAMES), lat and lon with miles and/or nearest to keep the colleges within 
+    that many miles or the nearest ones, fields (comma separated API_FIELDS), limit, offset, and 
+    format ("json" or "ndjson"). Responses carry an ETag of the dataset and the request, so 
+    clients can revalidate with If-None-Match.
+    '''
+
+    def get_list(self, name):
+        values = []
+        for value in self.get_arguments(name):
+            values += [part.strip() for part in value.split(",") if part.strip() != ""]
+        return values
+
+    def parse_request(self):
+        '''Returns the normalized query and response options, raising HTTPError 400 for bad input'''
+        try:
+            gpa_input = float(self.get_argument("gpa"))
+            limit = int(self.get_argument("limit", "100"))
+            offset = int(self.get_argument("offset", "0"))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="gpa, limit and offset must be numbers")
+        # also rejects nan and inf, which would match every college or none
+        if not 0 <= gpa_input <= 4.0:
+            raise tornado.web.HTTPError(400, reason="gpa must be 0 to 4.0")
+        if limit < 0 or limit > API_MAX_LIMIT or offset < 0:
+            raise tornado.web.HTTPError(400, reason="limit must be 0 to %d and offset at least 0" % API_MAX_LIMIT)
+
+        size_input = self.get_argument("size", "")
+        size_input = SIZE_NAMES.get(size_input, size_input)
+        type_inst_input = self.get_list("type") or ["Private", "Public"]
+        location_input = self.get_list("region") or list(REGION_DICT)
+        if (size_input not in SIZE_DICT or any(type_inst not in ("Private", "Public") for type_inst in type_inst_input)
+                or any(region not in REGION_DICT for region in location_input)):
+            raise tornado.web.HTTPError(400, reason="unknown size, type or region")
+
+        # repeated fields are returned once
+        fields = list(dict.fromkeys(self.get_list("fields"))) or API_FIELDS
+        if any(field not in API_FIELDS for field in fields):
+            raise tornado.web.HTTPError(400, reason="unknown field")
+
+        near_input = self.parse_near()
+
+        output_format = self.get_argument("format", "json")
+        if output_format not in ("json", "ndjson"):
+            raise tornado.web.HTTPError(400, reason='format must be "json" or "ndjson"')
+
+        query = normalize_query(gpa_input, type_inst_input, size_input, location_input, near_input)
+        return query, fields, limit, offset, output_format == "ndjson"
+
+    def parse_near(self):
+        '''Returns the near input of college_recs, or None, raising HTTPError 400 for bad input'''
+        names = ["lat", "lon", "miles", "nearest"]
+        values = [self.get_argument(name, None) for name in names]
+        if all(value is None for value in values):
+            return None
+        latitude, longitude, miles, count = values
+        if latitude is None or longitude is None or (miles is None and count is None):
+            raise tornado.web.HTTPError(400, reason="lat and lon must be given with miles or nearest")
+        try:
+            latitude, longitude = parse_coordinates(latitude + "," + longitude)
+        except ValueError as error:
+            raise tornado.web.HTTPError(400, reason=str(error))
+        try:
+            miles = None if miles is None else float(miles)
+            count = None if count is None else int(count)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="miles and nearest must be numbers")
+        if (miles is not None and not 0 < miles < float("inf")) or (count is not None and not 0 < count <= API_MAX_LIMIT):
+            raise tornado.web.HTTPError(400, reason="miles must be a positive number and nearest 1 to %d" % API_MAX_LIMIT)
+        return latitude, longitude, miles, count
+
+    async def get(self):
+        request = self.parse_request()
+        # loads and serializes on a thread so a dataset refresh or a large response doesn't stall 
+        # the website's sessions
+        etag, body = await tornado.ioloop.IOLoop.current().run_in_executor(
+            None, self.respond, request, self.request.headers.get("If-None-Match", ""))
+
+        self.set_header("Etag", etag)
+        self.set_header("Cache-Control", "public, max-age=300")
+        if body is None:
+            self.set_status(304)
+            return
+        if request[-1]:
+            self.set_header("Content-Type", "application/x-ndjson")
+        else:
+            self.set_header("Content-Type", "application/json")
+        self.write(body)
+
+    def respond(self, request, if_none_match):
+        '''
+        Returns a tuple of the ETag of the response and its body, or None as the body when it 
+        matches if_none_match, the client's If-None-Match header. Timed as an "api" request when 
+        the server runs with --metrics.
+        '''
+        with request_trace("api"):
+            with span("load"):
+                prepared = load_prepared()
+            # the same dataset files and request always give the same response
+            etag = '"%s"' % hashlib.sha1(json.dumps([prepared["signature"], request]).encode()).hexdigest()
+            if etag_matches(if_none_match, etag):
+                return etag, None
+            body = api_response(prepared, *request)
+            record_characters("api", len(body))
+            return etag, body
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps({"error": self._reason}))
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    '''GET /metrics returns the metrics of this process in the Prometheus text format, see metrics_text'''
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics_text())
+
+
+def stop_when_orphaned(parent):
+    '''Stops the server of a forked worker process once the parent process it was forked from has exited'''
+    if os.getppid() != parent:
+        tornado.ioloop.IOLoop.current().stop()
+
+
+def make_app():
+    '''
+    Output: 
+    - tornado application serving the website at /, the recommendation api at /api/colleges, 
+    plotly.js at /static/, and, when INSTRUMENT is on, the metrics at /metrics, with gzip 
+    compression of http responses
+    '''
+    from pywebio.platform.tornado import webio_handler
+
+    handlers = [(r"/", webio_handler(Website)), 
+                (r"/api/colleges", CollegesHandler), 
+                (r"/static/(.*)", tornado.web.StaticFileHandler, {"path": STATIC_DIR})]
+    if INSTRUMENT:
+        handlers.append((r"/metrics", MetricsHandler))
+    return tornado.web.Application(handlers, compress_response=True, websocket_ping_interval=30)
+
+
 if __name__ == '__main__':
-    pywebio.start_server(Website)
+    parser = argparse.ArgumentParser(description="College Application Guide website")
+    parser.add_argument("command", nargs="?", default="serve", choices=["serve", "build", "match"], 
+                        help='"serve" runs the website, "build" writes the prebuilt dataset and exits, '
+                             '"match" writes the table of matched college names and exits')
+    parser.add_argument("--port", type=int, default=8080, help="port to serve the website and api on")
+    parser.add_argument("--workers", type=int, default=0, 
+                        help="number of processes rendering maps and tables, 0 renders in each session's thread")
+    parser.add_argument("--processes", type=int, default=1, 
+                        help="number of server processes forked from one process that already loaded the "
+                             "dataset and plotly, sharing the port")
+    parser.add_argument("--metrics", action="store_true", 
+                        help="time and count requests, serve the metrics at /metrics, and log each request as json")
+    parser.add_argument("--profile-slow", type=float, default=None, metavar="SECONDS", 
+                        help="with --metrics, write the sampled stacks of requests slower than this to %s/" % PROFILE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        write_artifact(build_dataset())
+    elif args.command == "match":
+        colleges_locations = prepare_locations(pd.read_json(LOCATIONS_PATH))
+        colleges_stats = clean_stats(read_stats())
+        matches = match_names(build_name_index(colleges_locations["College"]), colleges_stats["College"])
+        write_matches(matches)
+        print(matches["Method"].value_counts().to_string())
+    else:
+        # the refreshes of the dataset are always logged, the requests only with --metrics
+        logging.basicConfig(level=logging.INFO if args.metrics else logging.WARNING, format="%(message)s")
+        logger.setLevel(logging.INFO)
+        print("Serving the website on http://localhost:%d/ and the api on http://localhost:%d/api/colleges" 
+              % (args.port, args.port))
+        if args.processes > 1:
+            # the workers are forked after everything is loaded, so they share it copy-on-write and 
+            # answer their first request as fast as any other; a worker that dies is forked again
+            warm_up()
+            sockets = tornado.netutil.bind_sockets(args.port)
+            # keeps the garbage collector from writing to the shared objects, which would copy them
+            gc.freeze()
+            parent = os.getpid()
+            tornado.process.fork_processes(args.processes)
+            tornado.ioloop.PeriodicCallback(lambda: stop_when_orphaned(parent), 1000).start()
+            if args.metrics:
+                start_instrumentation(args.profile_slow)
+            start_render_pool(args.workers)
+            tornado.httpserver.HTTPServer(make_app()).add_sockets(sockets)
+        else:
+            if args.metrics:
+                start_instrumentation(args.profile_slow)
+            # prepares the dataset before the first user arrives
+            load_dataset()
+            start_render_pool(args.workers)
+            make_app().listen(args.port)
+            if render_pool is None:
+                # loads plotly while the first user fills in the form
+                threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+        tornado.ioloop.IOLoop.current().start()
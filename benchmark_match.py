@@ -0,0 +1,185 @@
+'''
+Benchmarks matching the Appily college names to Opendatasoft names. The Opendatasoft names are
+synthetic: made from the names in colleges.csv, some written differently, plus made up colleges
+so there are as many as in the real data. Some changes are the ones match_names is written to
+undo ("&" for "and", "-Main Campus" added or left out, "St." for "Saint", a missing letter, ...),
+the others are not (words in another order, abbreviations, a state added), so the matches of
+each kind and the matches to the wrong college are reported separately. The numbers only say
+how the matcher handles these changes, not how many real colleges it matches.
+
+Run it from the folder holding colleges.csv, for example:
+    python benchmark_match.py --locations 6000 --naive-sample 100
+'''
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+import application
+
+
+# abbreviations normalize_name does not write out again
+ABBREVIATIONS = {"University": "U", "Technology": "Tech", "State": "St", "Community": "Comm",
+                 "International": "Intl", "Polytechnic": "Poly"}
+# kinds of changes match_names is not written to undo
+OTHER_KINDS = ["reordered", "abbreviated", "state"]
+
+
+def vary_name(name, choices, kind):
+    '''
+    Input:
+    - name: title cased college name
+    - choices: random.Random used to pick the change
+    - kind: "designed" for the ways the Opendatasoft data writes names differently, which
+    match_names is written to undo, or one of OTHER_KINDS
+
+    Output:
+    - the name written differently, or None when the kind of change does not apply to it
+    '''
+    words = name.split()
+    if kind == "designed":
+        variants = [name.replace(" And ", " & "),
+                    name.replace(" & ", " And "),
+                    name.replace("Saint ", "St. "),
+                    name.replace("-Main Campus", ""),
+                    name + "-Main Campus",
+                    name.replace("-", " "),
+                    name.replace("'", ""),
+                    "The " + name]
+        # a letter left out of the longest word
+        word = max(words, key=len)
+        if len(word) > 6:
+            cut = choices.randrange(1, len(word) - 1)
+            variants.append(name.replace(word, word[:cut] + word[cut + 1:], 1))
+    elif kind == "reordered":
+        # "University Of Chicago" as "Chicago University", "Boston College" as "College Of Boston"
+        if words[:2] == ["University", "Of"] and len(words) > 2:
+            variants = [" ".join(words[2:]) + " University"]
+        elif words[-1] in ("College", "University", "Institute") and len(words) > 1:
+            variants = ["%s Of %s" % (words[-1], " ".join(words[:-1]))]
+        else:
+            variants = [" ".join(words[1:] + words[:1])]
+    elif kind == "abbreviated":
+        variants = [name.replace(word, short) for word, short in ABBREVIATIONS.items() if word in words]
+    else:
+        variants = [name + "-" + choices.choice(sum(application.REGION_DICT.values(), []))]
+    variants = [variant for variant in variants if variant != name]
+    return choices.choice(variants) if variants else None
+
+
+def make_locations(stats_names, count, varied_share, other_share, seed):
+    '''
+    Input:
+    - stats_names: distinct title cased Appily names
+    - count: number of Opendatasoft names to make
+    - varied_share: share of the Appily names written differently
+    - other_share: share of those written in a way match_names is not written to undo
+    - seed: seed of the random changes
+
+    Output:
+    - tuple of the Opendatasoft names and a dictionary from each of them made from an Appily
+    name to that Appily name and the kind of change, "unchanged", "designed", or one of OTHER_KINDS
+    '''
+    choices = random.Random(seed)
+    names, truth = [], {}
+    for name in stats_names:
+        location, kind = name, "unchanged"
+        if choices.random() < varied_share:
+            kind = choices.choice(OTHER_KINDS) if choices.random() < other_share else "designed"
+            location = vary_name(name, choices, kind)
+            # names a change does not apply to, or that it turns into another college's name, stay the same
+            if location is None or location in truth:
+                location, kind = name, "unchanged"
+        names.append(location)
+        truth[location] = (name, kind)
+
+    # made up colleges from the words of real names, so they share words with them
+    words = sorted({word for name in stats_names for word in name.split() if word.isalpha()})
+    while len(names) < count:
+        name = "%s %s %s" % (choices.choice(words), choices.choice(["College", "University", "Institute"]),
+                             choices.choice(words))
+        if name not in truth:
+            names.append(name)
+    choices.shuffle(names)
+    return names, truth
+
+
+def naive_seconds_per_name(location_names, stats_names, sample):
+    '''
+    Returns the time to score one Appily name against every Opendatasoft name, the cost of matching
+    without an index
+    '''
+    location_trigrams = [application.name_trigrams(application.normalize_name(name)) for name in location_names]
+    start = time.perf_counter()
+    for name in stats_names[:sample]:
+        trigrams = application.name_trigrams(application.normalize_name(name))
+        max(2 * len(trigrams & other) / (len(trigrams) + len(other)) for other in location_trigrams)
+    return (time.perf_counter() - start) / sample
+
+
+def locations_frame(location_names, seed):
+    '''
+    Returns a data frame like the one returned by prepare_locations for the given names
+    '''
+    rows = np.random.default_rng(seed)
+    count = len(location_names)
+    return pd.DataFrame({"College": location_names,
+                         "City": "Some City",
+                         "State": rows.choice(sum(application.REGION_DICT.values(), []), count),
+                         "Country": "USA",
+                         "Website": ["https://college%d.edu" % number for number in range(count)],
+                         "Latitude": rows.uniform(25, 49, count),
+                         "Longitude": rows.uniform(-124, -67, count),
+                         "Location Row": np.arange(count)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark matching college names")
+    parser.add_argument("--locations", type=int, default=6000, help="number of Opendatasoft names")
+    parser.add_argument("--varied", type=float, default=0.2, help="share of Appily names written differently")
+    parser.add_argument("--other", type=float, default=0.5,
+                        help="share of those written in a way match_names is not written to undo")
+    parser.add_argument("--naive-sample", type=int, default=100, help="Appily names scored without the index")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    colleges_stats = application.clean_stats(application.read_stats())
+    stats_names = pd.unique(colleges_stats["College"]).tolist()
+    location_names, truth = make_locations(stats_names, args.locations, args.varied, args.other, args.seed)
+    colleges_locations = locations_frame(location_names, args.seed)
+
+    exact = colleges_stats.merge(colleges_locations[["College"]], on="College")["College"].nunique()
+
+    start = time.perf_counter()
+    name_index = application.build_name_index(location_names)
+    matches = application.match_names(name_index, colleges_stats["College"])
+    match_seconds = time.perf_counter() - start
+    # ambiguous matches stay in the match table for review but are not merged
+    matches = matches[matches["Method"] != "ambiguous"]
+    # a match is correct when the Opendatasoft name was made from that Appily name
+    correct = np.array([truth.get(college, (None,))[0] == name
+                        for name, college in zip(matches["Appily College"], matches["College"])], dtype=bool)
+    matched = set(matches["Appily College"][correct])
+
+    start = time.perf_counter()
+    merged = application.merge_datasets(colleges_locations, application.read_stats())
+    merge_seconds = time.perf_counter() - start
+
+    naive = naive_seconds_per_name(location_names, stats_names, args.naive_sample) * len(stats_names)
+
+    print("synthetic names: %d Opendatasoft names made from %d Appily names (%d rows), not the real data"
+          % (len(location_names), len(stats_names), len(colleges_stats)))
+    print("exact merge:   %d names matched (%.1f%%)" % (exact, 100 * exact / len(stats_names)))
+    print("indexed match: %d names matched correctly (%.1f%%), %s"
+          % (len(matched), 100 * len(matched) / len(stats_names), matches["Method"].value_counts().to_dict()))
+    for kind in ["unchanged", "designed"] + OTHER_KINDS:
+        names = [name for name, name_kind in truth.values() if name_kind == kind]
+        found = sum(name in matched for name in names)
+        print("  %-11s %5d names, %5d matched correctly (%.1f%%)" % (kind, len(names), found, 100 * found / max(len(names), 1)))
+    wrong = matches[~correct]
+    print("false positives: %d matches to the wrong Opendatasoft name, %s"
+          % (len(wrong), wrong["Method"].value_counts().to_dict()))
+    print("indexed match: %.3f s, whole merge_datasets: %.3f s (%d rows)" % (match_seconds, merge_seconds, len(merged)))
+    print("all pairs (estimated from %d names): %.1f s" % (args.naive_sample, naive))
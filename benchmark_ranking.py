@@ -0,0 +1,76 @@
+'''
+Benchmarks ranking colleges with top_positions, which partitions off the best scores, against
+sorting every score, on made up datasets of growing size, and checks both find the same scores.
+
+For example:
+    python benchmark_ranking.py --colleges 1000 10000 100000 --count 10
+'''
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import application
+
+
+def make_colleges(count, seed):
+    '''
+    Returns a data frame of count made up colleges with the columns build_score_columns uses
+    '''
+    rows = np.random.default_rng(seed)
+    rates = rows.integers(5, 101, count).astype(str)
+    return pd.DataFrame({"GPA": rows.uniform(2.0, 4.0, count).round(1),
+                         "Acceptance Rate": np.where(rows.random(count) < 0.1, " --", np.char.add(np.char.add(" ", rates), "%")),
+                         "Number of Students": rows.lognormal(7.5, 1.2, count).astype(int),
+                         "State": rows.choice(sum(application.REGION_DICT.values(), []), count),
+                         "Type of Institution": rows.choice(["Private", "Public"], count)})
+
+
+def sorted_top(prepared, gpa_input, type_inst_input, size_input, location_input, count):
+    '''
+    Returns the same as top_positions by sorting the scores of every college
+    '''
+    score_columns = prepared["score_columns"]
+    score = application.score_colleges(score_columns, gpa_input, size_input, location_input)
+    score[~application.selected_codes(score_columns["type"], score_columns["type_names"], type_inst_input)] = -np.inf
+    order = np.lexsort((np.arange(len(score)), -score))
+    best = order[:min(count, int(np.isfinite(score).sum()))]
+    return best, score[best]
+
+
+def milliseconds_per_query(function, prepared, queries, count):
+    '''
+    Returns the results of function for every query and the median time of a query in milliseconds
+    '''
+    results, times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(function(prepared, *query, count))
+        times.append(time.perf_counter() - start)
+    return results, 1000 * float(np.median(times))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark ranked college recommendations")
+    parser.add_argument("--colleges", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--count", type=int, default=10, help="number of ranked colleges")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    choices = np.random.default_rng(args.seed)
+    queries = [(float(choices.choice(np.arange(2.0, 4.01, 0.1)).round(1)),
+                [["Private"], ["Public"], ["Private", "Public"]][choices.integers(3)],
+                choices.choice(list(application.SIZE_DICT)),
+                list(choices.choice(list(application.REGION_DICT), choices.integers(1, 5), replace=False)))
+               for _ in range(args.queries)]
+
+    print("colleges  top_positions ms  full sort ms")
+    for count in args.colleges:
+        prepared = {"score_columns": application.build_score_columns(make_colleges(count, args.seed))}
+        partitioned, top = milliseconds_per_query(application.top_positions, prepared, queries, args.count)
+        full, full_sort = milliseconds_per_query(sorted_top, prepared, queries, args.count)
+        # colleges tied at the last place may differ, their scores may not
+        assert all(np.array_equal(a[1], b[1]) for a, b in zip(partitioned, full)), "scores differ"
+        print("%8d  %16.3f  %12.3f" % (count, top, full_sort))
@@ -0,0 +1,88 @@
+'''
+Benchmarks the spatial index against scanning every college for radius and nearest college
+queries, on made up colleges spread over the United States, and checks both give the same colleges.
+
+For example:
+    python benchmark_spatial.py --colleges 6000 60000 600000 --queries 200
+'''
+import argparse
+import time
+
+import numpy as np
+
+import application
+
+
+def scan_radius(latitudes, longitudes, latitude, longitude, miles, allowed):
+    '''
+    Returns the sorted positions of the allowed colleges within the distance of the point, found by
+    computing the distance to every college
+    '''
+    distances = application.haversine_miles(np.radians(latitude), np.radians(longitude), latitudes, longitudes)
+    return np.flatnonzero((distances <= miles) & allowed)
+
+
+def scan_nearest(latitudes, longitudes, latitude, longitude, count, allowed):
+    '''
+    Returns the sorted positions of the count allowed colleges nearest to the point, found by
+    computing the distance to every college
+    '''
+    distances = application.haversine_miles(np.radians(latitude), np.radians(longitude), latitudes, longitudes)
+    candidates = np.flatnonzero(allowed)
+    nearest = np.lexsort((candidates, distances[candidates]))[:count]
+    return np.sort(candidates[nearest])
+
+
+def milliseconds_per_query(function, queries):
+    '''
+    Returns the results of function for every query and the mean time of a query in milliseconds
+    '''
+    start = time.perf_counter()
+    results = [function(*query) for query in queries]
+    return results, 1000 * (time.perf_counter() - start) / len(queries)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark radius and nearest college queries")
+    parser.add_argument("--colleges", type=int, nargs="+", default=[6000, 60000, 600000])
+    parser.add_argument("--queries", type=int, default=200, help="queries of each kind")
+    parser.add_argument("--miles", type=float, default=100)
+    parser.add_argument("--nearest", type=int, default=10)
+    parser.add_argument("--allowed", type=float, default=0.3,
+                        help="share of colleges matching the other inputs, like a GPA and size filter")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("colleges  build ms  radius index/scan ms  nearest index/scan ms")
+    for count in args.colleges:
+        rows = np.random.default_rng(args.seed)
+        latitudes = rows.uniform(25, 49, count)
+        longitudes = rows.uniform(-124, -67, count)
+        allowed = rows.random(count) < args.allowed
+        points = list(zip(rows.uniform(25, 49, args.queries), rows.uniform(-124, -67, args.queries)))
+
+        start = time.perf_counter()
+        spatial_index = application.build_spatial_index(latitudes, longitudes)
+        build = 1000 * (time.perf_counter() - start)
+        radians = spatial_index["latitude"], spatial_index["longitude"]
+
+        radius_queries = [(latitude, longitude, args.miles) for latitude, longitude in points]
+        indexed, radius_index = milliseconds_per_query(
+            lambda latitude, longitude, miles: application.radius_positions(spatial_index, latitude, longitude, miles, allowed),
+            radius_queries)
+        scanned, radius_scan = milliseconds_per_query(
+            lambda latitude, longitude, miles: scan_radius(*radians, latitude, longitude, miles, allowed),
+            radius_queries)
+        assert all(np.array_equal(a, b) for a, b in zip(indexed, scanned)), "radius results differ"
+
+        nearest_queries = [(latitude, longitude, args.nearest) for latitude, longitude in points]
+        indexed, nearest_index = milliseconds_per_query(
+            lambda latitude, longitude, k: application.nearest_positions(spatial_index, latitude, longitude, k, allowed),
+            nearest_queries)
+        scanned, nearest_scan = milliseconds_per_query(
+            lambda latitude, longitude, k: scan_nearest(*radians, latitude, longitude, k, allowed),
+            nearest_queries)
+        assert all(np.array_equal(a, b) for a, b in zip(indexed, scanned)), "nearest results differ"
+
+        print("%8d  %8.1f  %9.3f / %-9.3f  %10.3f / %-9.3f"
+              % (count, build, radius_index, radius_scan, nearest_index, nearest_scan))
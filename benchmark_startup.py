@@ -0,0 +1,99 @@
+'''
+Benchmarks how fast the website starts: the time to import application (from python -X importtime),
+the time from starting the server to its first api response, and the time to draw the first map in
+a new process against a worker forked after warm_up.
+
+Run it from the folder holding the data sets, for example:
+    python benchmark_startup.py --runs 5 --processes 1 4
+'''
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+APPLICATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "application.py")
+QUERY = (3.5, ["Private", "Public"], "1,000 to 5,000 (Medium)", ["West", "South"])
+
+
+def import_seconds():
+    '''
+    Returns the seconds python -X importtime reports for importing application and everything it imports
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import application"],
+                            cwd=os.getcwd(), env=dict(os.environ, PYTHONPATH=os.path.dirname(APPLICATION)),
+                            stderr=subprocess.PIPE, text=True, check=True)
+    # the last line is application itself, with the cumulative microseconds in the second column
+    return int(result.stderr.strip().splitlines()[-1].split("|")[1]) / 1e6
+
+
+def first_response_seconds(port, processes):
+    '''
+    Returns the seconds from starting the server with the number of processes to its first api response
+    '''
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, APPLICATION, "--port", str(port), "--processes", str(processes)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen("http://localhost:%d/api/colleges?gpa=3.5&size=medium" % port, timeout=1).read()
+                return time.perf_counter() - start
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("the server exited before answering")
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+        # forked workers stop within a second of their parent, see stop_when_orphaned
+        time.sleep(1.5)
+
+
+def first_map_seconds(forked):
+    '''
+    Returns the seconds to draw the first map, in a new process from its start, or in a worker
+    forked from a process that already ran warm_up
+    '''
+    start = time.perf_counter()
+    import application
+    if not forked:
+        application.render_map(*QUERY)
+        return time.perf_counter() - start
+    application.warm_up()
+    reader, writer = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        start = time.perf_counter()
+        application.render_map(*QUERY)
+        os.write(writer, repr(time.perf_counter() - start).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return float(os.read(reader, 64))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the website")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--first-map", choices=["new", "forked"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.first_map is not None:
+        # run in a new process by the parent, which reads the result from stdout
+        print(first_map_seconds(args.first_map == "forked"))
+        sys.exit(0)
+
+    print("import application:        %.3f s" % np.median([import_seconds() for _ in range(args.runs)]))
+    for processes in args.processes:
+        seconds = np.median([first_response_seconds(args.port, processes) for _ in range(args.runs)])
+        print("first api response, %d process(es): %.3f s" % (processes, seconds))
+    for kind in ["new", "forked"]:
+        seconds = np.median([float(subprocess.run([sys.executable, __file__, "--first-map", kind],
+                                                  stdout=subprocess.PIPE, text=True, check=True).stdout)
+                             for _ in range(args.runs)])
+        print("first map, %-6s process:  %.3f s" % (kind, seconds))
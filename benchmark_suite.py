@@ -0,0 +1,291 @@
+'''
+Benchmarks the data and rendering hot paths of the website on made up datasets 1, 10, and 100 times
+the size of colleges.csv, and writes the time, peak memory, and output size of each as json.
+
+Run it from the folder holding colleges.csv, for example:
+    python benchmark_suite.py --output before.json
+    python benchmark_suite.py --output after.json --compare before.json
+
+With --compare, cases that got slower or use more memory than --threshold times the baseline are
+listed and the exit status is 1, so it can be used to catch regressions between commits.
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import application
+
+# the scrapy project lives in its own folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "colleges"))
+
+# broad query used by the filter, map, and table cases, all types and regions of one size
+QUERY = (4.0, ["Private", "Public"], "1,000 to 5,000 (Medium)", list(application.REGION_DICT))
+
+# college cards on each made up GPA page, like appily.com
+CARDS_PER_PAGE = 20
+
+CARD_HTML = (
+    '<article class="college-list--card gpa-result"><div class="college-list--card-head">'
+    '<div class="college-list--card-title-wrap"><div class="college-list--card-title">'
+    '<div class="college-list--card-title-conatiner"><a href="/colleges/{number}">{name}</a></div></div></div></div>'
+    '<div class="college-list--card-footer"><div class="college-list--card-outer">'
+    '<div class="college-list--card-inner"><div class="college-list--card-data-label">average gpa</div>'
+    '<div class="college-list--card-data-val"><div class="field average-gpa">{gpa}</div></div></div>'
+    '<div class="college-list--card-inner"><div class="college-list--card-data-label">acceptance rate</div>'
+    '<div class="college-list--card-data-val"><div class="field acceptance-rate">{rate}</div></div></div>'
+    '<div class="college-list--card-inner"><div class="college-list--card-data-label">type of institution</div>'
+    '<div class="college-list--card-data-val">{type}</div></div>'
+    '<div class="college-list--card-inner"><div class="college-list--card-data-label">number of students</div>'
+    '<div class="college-list--card-data-val">{students:,}</div></div>'
+    '</div></div></article>')
+
+
+def scaled_stats(scale):
+    '''
+    Returns colleges.csv repeated scale times, each copy with its own college names
+    '''
+    stats = pd.read_csv(application.STATS_PATH)
+    copies = []
+    for copy in range(scale):
+        frame = stats.copy()
+        if copy > 0:
+            frame["College"] = frame["College"] + " %d" % (copy + 1)
+        copies.append(frame)
+    return pd.concat(copies, ignore_index=True)
+
+
+def scaled_locations(stats, seed):
+    '''
+    Returns a data frame like the Opendatasoft json file with a college for every college name in
+    stats, as many made up colleges without statistics, and some colleges outside of the USA
+    '''
+    rows = np.random.default_rng(seed)
+    names = list(pd.unique(stats["College"]))
+    names += ["Made Up College %d" % number for number in range(len(names))]
+    count = len(names)
+    websites = np.where(rows.random(count) < 0.2, "NOT AVAILABLE",
+                        np.char.add(np.char.add("www.college", np.arange(count).astype(str)), ".edu"))
+    return pd.DataFrame({"geo_point_2d": [{"lon": lon, "lat": lat} for lat, lon
+                                          in zip(rows.uniform(25, 49, count), rows.uniform(-124, -67, count))],
+                         "name": [name.upper() for name in names],
+                         "city": "SOME CITY",
+                         "state": rows.choice(sum(application.REGION_DICT.values(), []), count),
+                         "country": np.where(rows.random(count) < 0.05, "PRI", "USA"),
+                         "website": websites,
+                         "zip": "00000"})
+
+
+def scaled_pages(stats):
+    '''
+    Returns a list of (url, html) of GPA pages holding a card for every row of stats
+    '''
+    columns = ["College", "GPA", "Acceptance Rate", "Type of Institution", "Number of Students"]
+    cards = [CARD_HTML.format(number=number, name=name, gpa=gpa, rate=rate, type=type_inst, students=students)
+             for number, (name, gpa, rate, type_inst, students)
+             in enumerate(stats[columns].itertuples(index=False, name=None))]
+    return [("https://www.appily.com/colleges/gpa/3.0?page=%d" % (start // CARDS_PER_PAGE),
+             "<html><body>%s</body></html>" % "".join(cards[start:start + CARDS_PER_PAGE]))
+            for start in range(0, len(cards), CARDS_PER_PAGE)]
+
+
+def install_prepared(data):
+    '''
+    Makes load_prepared return data with fresh indexes and caches, as if it was read from the data sources
+    '''
+    # a new version each time, so nothing cached for earlier data is reused
+    prepared = application.build_prepared(data, application.dataset_signature(), time.perf_counter(), None, None)
+    application._dataset_cache["prepared"] = prepared
+    return prepared
+
+
+def output_bytes(output):
+    '''
+    Returns the size of what a case returned: characters of text, bytes of numbers, arrays, and data 
+    frames, and the sum of the sizes of the parts of lists and dictionaries
+    '''
+    if isinstance(output, str):
+        return len(output)
+    if isinstance(output, (int, float, np.number)):
+        return 8
+    if isinstance(output, pd.DataFrame):
+        return int(output.memory_usage(deep=True).sum())
+    if isinstance(output, np.ndarray):
+        return output.nbytes
+    if isinstance(output, (list, tuple)):
+        return sum(output_bytes(part) for part in output)
+    # dictionaries and scrapy items
+    if hasattr(output, "values"):
+        return sum(output_bytes(part) for part in output.values())
+    return 0
+
+
+def measure(function, repeat):
+    '''
+    Returns the median and fastest time of repeat calls of function in seconds, its peak memory in
+    bytes during one more call, and the size of what it returned
+    '''
+    # the first call also pays for imports and caches filled on first use, such as plotly's templates
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        times.append(time.perf_counter() - start)
+    # tracemalloc slows python code down, so memory is measured in a call of its own
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": float(np.median(times)),
+            "seconds_min": float(min(times)),
+            "peak_bytes": peak,
+            "output_bytes": output_bytes(output)}
+
+
+def parse_cases(pages):
+    '''
+    Returns the parse_stats case, or None when scrapy is not installed
+    '''
+    try:
+        from scrapy.http import HtmlResponse, Request
+        from colleges.spiders.college_spider import collegeSpider
+    except ImportError:
+        return None
+    spider = collegeSpider()
+
+    def parse_pages():
+        return [item for url, body in pages
+                for item in spider.parse_stats(HtmlResponse(url=url, body=body, encoding="utf-8"))
+                if not isinstance(item, Request)]
+    return parse_pages
+
+
+def run_scale(scale, repeat, cases, seed):
+    '''
+    Returns the results of every selected case on a dataset scale times the size of colleges.csv
+    '''
+    stats = scaled_stats(scale)
+    locations_json = scaled_locations(stats, seed)
+    colleges_locations = application.prepare_locations(locations_json)
+    data = application.merge_datasets(colleges_locations, stats)
+    prepared = install_prepared(data)
+    query = application.normalize_query(*QUERY)
+    positions = application.query_positions(prepared, query)
+    college_table = application.college_recs(*QUERY)
+    # renders every call, so the cases measure rendering and not the cache
+    application.render_cache = application.RenderCache(0, 0)
+
+    def filter_uncached():
+        prepared["positions"] = application.RenderCache(0, 0)
+        return application.query_positions(prepared, query)
+
+    all_cases = {
+        "prepare_df": lambda: application.prepare_df(locations_json),
+        "prepare_locations": lambda: application.prepare_locations(locations_json),
+        "merge_datasets": lambda: application.merge_datasets(colleges_locations, stats),
+        "filter_index": lambda: application.build_filter_index(data),
+        "filter": filter_uncached,
+        "college_recs": lambda: application.college_recs(*QUERY),
+        "map_full": lambda: application.college_recs_map(college_table).to_html(include_plotlyjs="require", full_html=False),
+        "map_compact": lambda: application.college_recs_map_compact(college_table).to_html(include_plotlyjs="require", full_html=False),
+        "map_clustered": lambda: application.college_recs_map_clustered(prepared, positions).to_html(
+            include_plotlyjs="require", full_html=False, post_script=application.cluster_zoom_script()),
+        "table_page": lambda: application.table_html(query, None, False, 0),
+        "table_full": lambda: college_table.drop(["Latitude", "Longitude", "index"], axis=1).to_html(border=0, render_links=True),
+        "parse_stats": parse_cases(scaled_pages(stats)) if "parse_stats" in cases else None,
+    }
+
+    results = []
+    for case in cases:
+        function = all_cases[case]
+        if function is None:
+            print("skipping %s, scrapy is not installed" % case, file=sys.stderr)
+            continue
+        result = {"case": case, "scale": scale, "rows": len(data), "matches": len(positions)}
+        result.update(measure(function, repeat))
+        print("%-18s x%-4d %9.4f s  %12d peak bytes  %12d output bytes"
+              % (case, scale, result["seconds"], result["peak_bytes"], result["output_bytes"]), file=sys.stderr)
+        results.append(result)
+    return results
+
+
+def environment():
+    '''
+    Returns the git commit and versions the benchmark ran with
+    '''
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__}
+
+
+def compare(results, baseline, threshold, min_seconds):
+    '''
+    Prints how each case changed against the baseline results and returns the cases that got
+    slower or use more memory than threshold times the baseline; cases that got less than 
+    min_seconds slower are not counted as slower, since very fast cases vary more than that
+    '''
+    before = {(result["case"], result["scale"]): result for result in baseline["results"]}
+    regressions = []
+    print("%-18s %6s %10s %10s %7s %7s" % ("case", "scale", "before s", "after s", "time", "memory"))
+    for result in results:
+        old = before.get((result["case"], result["scale"]))
+        if old is None:
+            continue
+        time_ratio = result["seconds"] / max(old["seconds"], 1e-9)
+        memory_ratio = result["peak_bytes"] / max(old["peak_bytes"], 1)
+        flag = ""
+        slower = time_ratio > threshold and result["seconds"] - old["seconds"] > min_seconds
+        if slower or memory_ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(result["case"])
+        print("%-18s %6d %10.4f %10.4f %6.2fx %6.2fx%s"
+              % (result["case"], result["scale"], old["seconds"], result["seconds"], time_ratio, memory_ratio, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    cases = ["prepare_df", "prepare_locations", "merge_datasets", "filter_index", "filter", "college_recs",
+             "map_full", "map_compact", "map_clustered", "table_page", "table_full", "parse_stats"]
+    parser = argparse.ArgumentParser(description="Benchmark the data and rendering hot paths")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--cases", nargs="+", default=cases, choices=cases)
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls of each case")
+    parser.add_argument("--output", help="json file to write the results to, printed when not given")
+    parser.add_argument("--compare", help="json file of earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="ratio to the earlier time or peak memory counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.001,
+                        help="smallest slowdown in seconds counted as a regression")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        results += run_scale(scale, args.repeat, args.cases, args.seed)
+    report = {"environment": environment(), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold, args.min_seconds)
+        sys.exit(1 if regressions else 0)
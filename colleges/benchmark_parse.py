@@ -0,0 +1,84 @@
+'''
+Times parse_stats on saved GPA pages and reports how many college cards it parses per second, 
+next to the selectors parse_stats used before it walked each card once.
+
+Save some GPA pages (e.g. https://www.appily.com/colleges/gpa/3.5?page=0) as .html files in a 
+folder, then run from this folder:
+    python benchmark_parse.py path/to/pages
+'''
+import argparse
+import glob
+import os
+import time
+
+from scrapy.http import HtmlResponse, Request
+
+from colleges.spiders.college_spider import collegeSpider
+
+
+def legacy_parse_stats(response):
+    '''
+    parse_stats as it was before parse_card, kept to compare against
+    '''
+    for college in response.css("article.college-list--card.gpa-result"):  
+        college_name = college.css("div.college-list--card-head div.college-list--card-title-wrap div.college-list--card-title div.college-list--card-title-conatiner a::text").get()
+        gpa = college.css("div.college-list--card-footer div.college-list--card-outer div.college-list--card-inner div.college-list--card-data-val div.field.average-gpa::text").get()
+        acceptance_rate = college.css("div.college-list--card-footer div.college-list--card-outer div.college-list--card-inner div.college-list--card-data-val div.field.acceptance-rate::text").get() 
+
+        for match in college.css("div.college-list--card-footer div.college-list--card-outer div.college-list--card-inner"):       
+
+            if match.css("div.college-list--card-data-label::text").get() == "type of institution":
+                type_institution = match.css("div.college-list--card-data-val::text").get()
+
+            if match.css("div.college-list--card-data-label::text").get() == "number of students":
+                num_students = match.css("div.college-list--card-data-val::text").get()
+                num_students = int(num_students.replace(",", ""))
+
+        yield {"College" : college_name, 
+              "GPA" : gpa,
+              "Acceptance Rate" : acceptance_rate,
+              "Type of Institution" : type_institution,
+              "Number of Students" : round(num_students/4)}
+
+
+def read_pages(folder):
+    '''
+    Returns a list of (url, body) for every .html file in folder
+    '''
+    pages = []
+    for path in sorted(glob.glob(os.path.join(folder, "*.html"))):
+        with open(path, "rb") as file:
+            pages.append(("file://" + os.path.abspath(path), file.read()))
+    return pages
+
+
+def cards_per_second(parse, pages, repeat):
+    '''
+    Returns the number of college cards parse turns into items per second, including parsing the html
+    '''
+    cards = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url, body in pages:
+            response = HtmlResponse(url=url, body=body, encoding="utf-8")
+            cards += sum(1 for item in parse(response) if not isinstance(item, Request))
+    return cards / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark parse_stats on saved GPA pages")
+    parser.add_argument("folder", help="folder of saved GPA pages (.html files)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of times to parse every page")
+    args = parser.parse_args()
+
+    pages = read_pages(args.folder)
+    spider = collegeSpider()
+    # parse_stats is called without gpa_url, so it does not request further pages
+    current = [item for url, body in pages for item in spider.parse_stats(HtmlResponse(url=url, body=body, encoding="utf-8"))]
+    legacy = [item for url, body in pages for item in legacy_parse_stats(HtmlResponse(url=url, body=body, encoding="utf-8"))]
+    if current != legacy:
+        print("warning: parse_stats and the legacy selectors return different items")
+
+    print("%d pages, %d cards" % (len(pages), len(current)))
+    print("legacy selectors: %.0f cards/s" % cards_per_second(legacy_parse_stats, pages, args.repeat))
+    print("parse_stats:      %.0f cards/s" % cards_per_second(spider.parse_stats, pages, args.repeat))
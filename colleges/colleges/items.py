@@ -4,9 +4,14 @@
 # https://docs.scrapy.org/en/latest/topics/items.html
 
 import scrapy
+from scrapy.item import ItemMeta
 
 
-class CollegesItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+# Columns of colleges.csv, the app merges on these names
+COLLEGE_FIELDS = ["College", "GPA", "Acceptance Rate", "Type of Institution", "Number of Students"]
+
+# The field names contain spaces, so the item class is built from a dictionary
+# instead of a class body
+CollegesItem = ItemMeta("CollegesItem", (scrapy.Item,), 
+                        {"__module__": __name__, 
+                         **{name: scrapy.Field() for name in COLLEGE_FIELDS}})
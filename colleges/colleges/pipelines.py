@@ -4,10 +4,132 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 
+import os
+
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+
+
+# Types of institution a college can have
+INSTITUTION_TYPES = ["Private", "Public"]
 
 
 class CollegesPipeline:
+    '''
+    Turns the strings scraped by college_spider into typed values and drops invalid colleges and 
+    colleges already seen on another GPA page
+    '''
+
+    def open_spider(self, spider):
+        self.seen = set()
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        college = (adapter.get("College") or "").strip()
+        if college == "":
+            raise DropItem("college without a name")
+        # the same college is listed on the page of every GPA above its average
+        if college in self.seen:
+            raise DropItem("duplicate college %s" % college)
+
+        try:
+            gpa = float(adapter.get("GPA"))
+            num_students = int(adapter.get("Number of Students"))
+        except (TypeError, ValueError):
+            raise DropItem("college %s has a missing or malformed GPA or number of students" % college)
+
+        # " 97%" is stored as 97.0, colleges that don't report it ("--") as None
+        try:
+            acceptance_rate = float((adapter.get("Acceptance Rate") or "").strip().rstrip("%"))
+        except ValueError:
+            acceptance_rate = None
+
+        type_institution = (adapter.get("Type of Institution") or "").strip().title()
+        if type_institution not in INSTITUTION_TYPES:
+            raise DropItem("college %s has unknown type of institution %r" % (college, type_institution))
+
+        self.seen.add(college)
+        adapter["College"] = college
+        adapter["GPA"] = gpa
+        adapter["Acceptance Rate"] = acceptance_rate
+        adapter["Type of Institution"] = type_institution
+        adapter["Number of Students"] = num_students
+        return item
+
+
+class ArrowExportPipeline:
+    '''
+    Streams the typed colleges into an Arrow IPC (Feather) file in batches, which the website can 
+    memory-map instead of parsing a csv file. Needs pyarrow and runs after CollegesPipeline.
+    '''
+
+    def __init__(self, path, batch_size):
+        try:
+            import pyarrow
+        except ImportError:
+            raise NotConfigured("pyarrow is not installed, colleges are only written by the feed exports")
+        self.pa = pyarrow
+        self.path = path
+        self.batch_size = batch_size
+        self.schema = pyarrow.schema([("College", pyarrow.string()), 
+                                      ("GPA", pyarrow.float32()), 
+                                      ("Acceptance Rate", pyarrow.float32()), 
+                                      ("Type of Institution", pyarrow.dictionary(pyarrow.int8(), pyarrow.string())), 
+                                      ("Number of Students", pyarrow.int32())])
+        self.dictionary = pyarrow.array(INSTITUTION_TYPES)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("COLLEGES_ARROW_PATH")
+        if not path:
+            raise NotConfigured("COLLEGES_ARROW_PATH is not set")
+        pipeline = cls(path, crawler.settings.getint("COLLEGES_ARROW_BATCH_SIZE", 500))
+        # close_spider does not get the reason the crawl stopped, the spider_closed signal does
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        # written to a temporary file, which spider_closed only swaps in for a finished crawl 
+        # with colleges, so a crawl that fails or is cancelled never replaces the last good file
+        self.writer = self.pa.ipc.new_file(self.path + ".tmp", self.schema)
+        self.rows = {name: [] for name in self.schema.names}
+        self.written = 0
+
     def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        for name in self.schema.names:
+            self.rows[name].append(adapter.get(name))
+        if len(self.rows["College"]) >= self.batch_size:
+            self.write_batch()
         return item
+
+    def write_batch(self):
+        if len(self.rows["College"]) == 0:
+            return
+        columns = []
+        for field in self.schema:
+            if field.name == "Type of Institution":
+                # every batch shares one dictionary, which the IPC file format requires
+                indices = self.pa.array([INSTITUTION_TYPES.index(value) for value in self.rows[field.name]], 
+                                        type=self.pa.int8())
+                columns.append(self.pa.DictionaryArray.from_arrays(indices, self.dictionary))
+            else:
+                columns.append(self.pa.array(self.rows[field.name], type=field.type))
+        self.writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+        self.written += len(self.rows["College"])
+        self.rows = {name: [] for name in self.schema.names}
+
+    def close_spider(self, spider):
+        self.write_batch()
+        self.writer.close()
+
+    def spider_closed(self, spider, reason):
+        # sent after close_spider, with reason "finished" only when the crawl ran to its end
+        if reason == "finished" and self.written > 0:
+            os.replace(self.path + ".tmp", self.path)
+        else:
+            spider.logger.warning("keeping %s, the crawl stopped with %r after %d colleges", 
+                                  self.path, reason, self.written)
+            os.remove(self.path + ".tmp")
@@ -1,10 +1,91 @@
 import scrapy
 
+from colleges.items import CollegesItem
+
+
+def has_class(name):
+    '''
+    Returns an XPath condition that is true for elements with the given class
+    '''
+    return 'contains(concat(" ", normalize-space(@class), " "), " %s ")' % name
+
+# cards of colleges on a GPA page, the same elements as article.college-list--card.gpa-result
+CARD_XPATH = "//article[%s and %s]" % (has_class("college-list--card"), has_class("gpa-result"))
+# link to the next page in the pager under the cards, missing on the last page
+NEXT_PAGE_XPATH = '//a[@rel="next"]/@href | //li[%s]/a/@href' % has_class("pager__item--next")
+# any element of that pager
+PAGER_XPATH = '//*[@rel="next" or contains(@class, "pager")]'
+# most pages crawled for one GPA when max_pages is not given
+MAX_PAGES = 200
+
+
+def first_text(element):
+    '''
+    Returns the first text directly inside an lxml element, like the ::text selector followed by .get()
+    '''
+    if element.text is not None:
+        return element.text
+    for child in element:
+        if child.tail is not None:
+            return child.tail
+    return None
+
+
+def parse_card(card):
+    '''
+    Walks the lxml element of one college card once and returns the college name, average GPA, 
+    acceptance rate, institution type, and number of undergraduate students per grade level
+    '''
+    college = {"College" : None, 
+               "GPA" : None,
+               "Acceptance Rate" : None,
+               "Type of Institution" : None,
+               "Number of Students" : None}
+
+    in_title = False
+    label = None
+    for element in card.iter("div", "a"):
+        # the college name is the first link inside the title container
+        if element.tag == "a":
+            if in_title and college["College"] is None:
+                college["College"] = first_text(element)
+            continue
+
+        classes = element.get("class", "").split()
+        if "college-list--card-title-conatiner" in classes:
+            in_title = True
+        elif "average-gpa" in classes:
+            college["GPA"] = first_text(element)
+        elif "acceptance-rate" in classes:
+            college["Acceptance Rate"] = first_text(element)
+        # the other statistics are a label followed by its value
+        elif "college-list--card-data-label" in classes:
+            label = first_text(element)
+        elif "college-list--card-data-val" in classes:
+            if label == "type of institution":
+                college["Type of Institution"] = first_text(element)
+            elif label == "number of students":
+                num_students = int(first_text(element).replace(",", ""))
+                college["Number of Students"] = round(num_students/4)
+    return college
+
+
 class collegeSpider(scrapy.Spider):
     name = 'college_spider'
 
     start_urls = ["https://www.appily.com/colleges/gpa"]
 
+    def __init__(self, start_url=None, max_pages=None, *args, **kwargs):
+        '''
+        Optional spider arguments (scrapy crawl college_spider -a name=value):
+        start_url: page listing the GPAs, e.g. a local copy of the site for offline crawls
+        max_pages: most pages to crawl for each GPA, MAX_PAGES by default
+        '''
+        super().__init__(*args, **kwargs)
+        if start_url is not None:
+            self.start_urls = [start_url]
+        self.max_pages = int(max_pages) if max_pages is not None else MAX_PAGES
+
     def parse(self, response):
         '''
         Meant to parse the starting url page with all the GPAs 
@@ -16,41 +97,42 @@ class collegeSpider(scrapy.Spider):
 
         # loops through all GPA page links 
         for link in gpa_college_url:
-            # loops through all additional pages under each GPA
-            for i in range(5):   
-                url = "https://www.appily.com" + link + "?page=" + str(i)
-                i += 1
-                # Yield scrapy.Request using the url for the specified GPA page
-                yield scrapy.Request(url, callback = self.parse_stats)
+            # Yield scrapy.Request using the url for the first page of the specified GPA,
+            # parse_stats then follows the additional pages
+            yield self.gpa_page_request(response.urljoin(link), 0)
 
+    def gpa_page_request(self, gpa_url, page, url=None, previous_names=None):
+        '''
+        Returns the scrapy.Request for the given page, starting from 0, of colleges for the GPA at gpa_url,
+        at url when the pager links to it and at gpa_url?page=N otherwise
+        '''
+        if url is None:
+            url = gpa_url + "?page=" + str(page)
+        return scrapy.Request(url, callback = self.parse_stats, 
+                              cb_kwargs = {"gpa_url": gpa_url, "page": page, "previous_names": previous_names})
 
-    def parse_stats(self, response):
+    def parse_stats(self, response, gpa_url=None, page=0, previous_names=None):
         '''
         Meant to parse the page for all colleges of a given GPA
         Returns the college name, average GPA, acceptance rate, institution type, and total number of 
         undergraduate students for each college
+        Requests the next page of the GPA from the pager's next link, or from ?page=N+1 on pages 
+        without a pager, and stops when a page has no colleges or the same colleges as the page before
         '''
-
-        # loops through each college on GPA page
         # scrapes college name, average gpa, acceptance rate, institution type, total number of undergrad
-        for college in response.css("article.college-list--card.gpa-result"):  
-            college_name = college.css("div.college-list--card-head div.college-list--card-title-wrap div.college-list--card-title div.college-list--card-title-conatiner a::text").get()
-            gpa = college.css("div.college-list--card-footer div.college-list--card-outer div.college-list--card-inner div.college-list--card-data-val div.field.average-gpa::text").get()
-            acceptance_rate = college.css("div.college-list--card-footer div.college-list--card-outer div.college-list--card-inner div.college-list--card-data-val div.field.acceptance-rate::text").get() 
-
-            for match in college.css("div.college-list--card-footer div.college-list--card-outer div.college-list--card-inner"):       
-
-                if match.css("div.college-list--card-data-label::text").get() == "type of institution":
-                    type_institution = match.css("div.college-list--card-data-val::text").get()
-
-                if match.css("div.college-list--card-data-label::text").get() == "number of students":
-                    num_students = match.css("div.college-list--card-data-val::text").get()
-                    num_students = int(num_students.replace(",", ""))
-
-            yield {"College" : college_name, 
-                  "GPA" : gpa,
-                  "Acceptance Rate" : acceptance_rate,
-                  "Type of Institution" : type_institution,
-                  "Number of Students" : round(num_students/4)}
-            
-           
\ No newline at end of file
+        colleges = [parse_card(college.root) for college in response.xpath(CARD_XPATH)]
+        names = [college["College"] for college in colleges]
+        # Drupal Views answers page numbers past the end with the last page again
+        if len(colleges) == 0 or names == previous_names:
+            return
+
+        if gpa_url is not None and page + 1 < self.max_pages:
+            next_url = response.xpath(NEXT_PAGE_XPATH).get()
+            if next_url is not None:
+                yield self.gpa_page_request(gpa_url, page + 1, response.urljoin(next_url), names)
+            # a pager without a next link means this is the last page
+            elif len(response.xpath(PAGER_XPATH)) == 0:
+                yield self.gpa_page_request(gpa_url, page + 1, None, names)
+
+        for college in colleges:
+            yield CollegesItem(college)
@@ -0,0 +1,84 @@
+'''
+Simulates several website sessions at once and reports how long rendering the map and table 
+takes for each number of render workers.
+
+Run it from the folder holding the data sources, for example:
+    python load_test.py --sessions 8 --requests 10 --workers 0 1 4
+'''
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+
+import application
+
+
+def simulate_session(requests, seed, latencies):
+    '''
+    Input: 
+    - requests: number of form submissions the session makes
+    - seed: seed for picking the session's random inputs
+    - latencies: list the time of each submission, in seconds, is appended to
+    
+    Output: 
+    - renders the map and first table page for random inputs, like Website does after a submission
+    '''
+    choices = random.Random(seed)
+    for _ in range(requests):
+        gpa = choices.choice(np.round(np.arange(2.0, 4.01, 0.1), 1).tolist())
+        school_type = choices.sample(["Private", "Public"], choices.randint(1, 2))
+        size = choices.choice(list(application.SIZE_DICT))
+        location = choices.sample(list(application.REGION_DICT), choices.randint(1, 4))
+
+        start = time.perf_counter()
+        application.render_map(gpa, school_type, size, location)
+        application.render_table(gpa, school_type, size, location)
+        latencies.append(time.perf_counter() - start)
+
+
+def run_load_test(sessions, requests, workers):
+    '''
+    Input: 
+    - sessions: number of sessions running at the same time
+    - requests: number of submissions made by each session
+    - workers: number of render worker processes, 0 renders in each session's thread
+    
+    Output: 
+    - dictionary with the median and 99th percentile latency in milliseconds and the throughput in 
+    submissions per second
+    '''
+    application.start_render_pool(workers)
+    # renders every submission, so the test measures rendering and not the cache
+    application.render_cache = application.RenderCache(0, 0)
+
+    latencies = []
+    threads = [threading.Thread(target=simulate_session, args=(requests, seed, latencies)) 
+               for seed in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if application.render_pool is not None:
+        application.render_pool.shutdown()
+    return {"p50": np.percentile(latencies, 50) * 1000, 
+            "p99": np.percentile(latencies, 99) * 1000, 
+            "throughput": len(latencies) / elapsed}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test for the College Application Guide website")
+    parser.add_argument("--sessions", type=int, default=8, help="number of sessions running at the same time")
+    parser.add_argument("--requests", type=int, default=10, help="number of submissions made by each session")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="numbers of render workers to compare")
+    args = parser.parse_args()
+
+    application.load_prepared()
+    print("workers  p50 (ms)  p99 (ms)  throughput (/s)")
+    for workers in args.workers:
+        result = run_load_test(args.sessions, args.requests, workers)
+        print("%7d  %8.1f  %8.1f  %15.2f" % (workers, result["p50"], result["p99"], result["throughput"]))
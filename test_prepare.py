@@ -0,0 +1,73 @@
+'''
+Checks that prepare_df and the coordinate split of prepare_locations give the same results as the
+loop based versions they replaced, on a small made up Opendatasoft data frame.
+
+Run it with:
+    python -m pytest test_prepare.py
+'''
+import numpy as np
+import pandas as pd
+
+import application
+
+
+def loop_prepare_df(df):
+    '''prepare_df as it was written with a loop over the websites'''
+    df = df[["geo_point_2d","name", "city", "state", "country", "website"]]
+    df = df.rename(columns={"geo_point_2d":"Coordinates", "name": "College", "city":"City", "state":"State", "country":"Country", "website":"Website"})
+    df["College"] = df["College"].apply(lambda x: x.title())
+    df["City"] = df["City"].apply(lambda x: x.title())
+    not_USA_colleges = df[(df['Country'] != 'USA')].index
+    df = df.drop(not_USA_colleges)
+    new_websites = []
+    for website in df["Website"]:
+        if (website.startswith("https://") == False) and (website.startswith("NOT") == False):
+            website = 'https://' + website
+            new_websites.append(website)
+        else:
+            new_websites.append(website)
+    df["Website"] = new_websites
+    return(df)
+
+
+def loop_split_coordinates(df):
+    '''Latitude and Longitude lists as they were taken from the Coordinates column with a loop'''
+    df = df.reset_index()
+    lat = []
+    lon = []
+    for i in range(0, df.shape[0]):
+        for key, value in df["Coordinates"][i].items():
+            if key == "lat":
+                lat.append(value)
+            if key == "lon":
+                lon.append(value)
+    return lat, lon
+
+
+def opendatasoft_frame():
+    '''Returns a made up Opendatasoft data frame with the cases prepare_df treats differently'''
+    return pd.DataFrame({
+        "geo_point_2d": [{"lon": -118.44, "lat": 34.07}, {"lon": -71.1, "lat": 42.37}, {"lon": 2.35, "lat": 48.85},
+                         {"lon": -87.6, "lat": 41.79}, {"lat": 40.0, "lon": -105.27}],
+        "name": ["UNIVERSITY OF CALIFORNIA-LOS ANGELES", "HARVARD UNIVERSITY", "UNIVERSITE DE PARIS",
+                 "UNIVERSITY OF CHICAGO", "UNIVERSITY OF COLORADO BOULDER"],
+        "city": ["LOS ANGELES", "CAMBRIDGE", "PARIS", "CHICAGO", "BOULDER"],
+        "state": ["CA", "MA", "NOT AVAILABLE", "IL", "CO"],
+        "country": ["USA", "USA", "FRA", "USA", "USA"],
+        "website": ["www.ucla.edu", "https://www.harvard.edu", "www.u-paris.fr", "NOT AVAILABLE",
+                    "http://www.colorado.edu"],
+        "zip": ["90095", "02138", "75006", "60637", "80309"]})
+
+
+def test_prepare_df_matches_loop_version():
+    df = opendatasoft_frame()
+    pd.testing.assert_frame_equal(application.prepare_df(df.copy()), loop_prepare_df(df.copy()))
+
+
+def test_coordinate_split_matches_loop_version():
+    df = opendatasoft_frame()
+    lat, lon = loop_split_coordinates(loop_prepare_df(df.copy()))
+    locations = application.prepare_locations(df.copy())
+    np.testing.assert_array_equal(locations["Latitude"].to_numpy(), lat)
+    np.testing.assert_array_equal(locations["Longitude"].to_numpy(), lon)
+    assert "Coordinates" not in locations.columns
@@ -0,0 +1,65 @@
+'''
+Checks how parse_stats of the college spider moves between the pages of colleges for one GPA, on 
+two saved GPA pages in the fixtures folder.
+
+Run it with:
+    python -m pytest test_spider.py
+'''
+import os
+import re
+import sys
+
+from scrapy.http import HtmlResponse, Request
+
+# the spider is imported the way scrapy imports it from the colleges folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "colleges"))
+from colleges.spiders.college_spider import collegeSpider
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GPA_URL = "https://www.appily.com/colleges/gpa/3.5"
+
+
+def saved_page(page, url=None, pager=True):
+    '''Returns the saved GPA page as a response from url, without its pager when pager is False'''
+    with open(os.path.join(FIXTURES, "gpa_page_%d.html" % page), "rb") as file:
+        body = file.read()
+    if not pager:
+        body = re.sub(rb"<nav.*?</nav>", b"", body, flags=re.DOTALL)
+    return HtmlResponse(url=url or GPA_URL + "?page=%d" % page, body=body, encoding="utf-8")
+
+
+def crawl(response, **kwargs):
+    '''Returns the requests and the college names parse_stats yields for the response'''
+    results = list(collegeSpider().parse_stats(response, gpa_url=GPA_URL, **kwargs))
+    requests = [result for result in results if isinstance(result, Request)]
+    names = [result["College"] for result in results if not isinstance(result, Request)]
+    return requests, names
+
+
+def test_follows_next_link():
+    requests, names = crawl(saved_page(0), page=0)
+    assert names == ["Boston College", "Ohio State University"]
+    assert [request.url for request in requests] == [GPA_URL + "?page=1"]
+    assert requests[0].cb_kwargs["page"] == 1
+    assert requests[0].cb_kwargs["previous_names"] == names
+
+
+def test_stops_on_last_page():
+    requests, names = crawl(saved_page(1), page=1)
+    assert names == ["Reed College", "Iowa State University"]
+    assert requests == []
+
+
+def test_stops_on_repeated_page_without_pager():
+    # without a pager the next page number is requested, until the site answers with the same page
+    requests, names = crawl(saved_page(1, pager=False), page=1)
+    assert [request.url for request in requests] == [GPA_URL + "?page=2"]
+    requests, names = crawl(saved_page(1, GPA_URL + "?page=2", pager=False), page=2,
+                            previous_names=requests[0].cb_kwargs["previous_names"])
+    assert requests == [] and names == []
+
+
+def test_stops_at_max_pages():
+    spider = collegeSpider(max_pages="1")
+    results = list(spider.parse_stats(saved_page(0), gpa_url=GPA_URL, page=0))
+    assert not any(isinstance(result, Request) for result in results)